@@ -11,5 +11,5 @@ bind = f"{host}:{port}"
 workers = 2
 threads = 2
 timeout = 5
-preload_app = True
+preload_app = True  # start the capture workers (VIDEO_SOURCES) once, for all workers
 # pylint: enable=invalid-name
@@ -3,7 +3,9 @@
 
 """Application Entrypoint"""
 
-from mjpegazer import Server
+from multiprocessing import parent_process
+
+from mjpegazer import Server, Supervisor
 from mjpegazer.utils import get_logger, constants
 
 
@@ -11,6 +13,8 @@ logger = get_logger(__name__)
 
 
 Server.configure(constants.VIDEO_URL)
+if constants.VIDEO_SOURCES and parent_process() is None:  # not in a capture worker
+    Server.supervise(Supervisor.from_environment())
 app = Server.flask(__name__, health_route="/health", live_route="/live")
 
 if __name__ == "__main__":
@@ -1,8 +1,17 @@
 """MJPEG Gazer, Capture and serve video streams over MJPEG to web browers"""
 
 from . import core, utils
-from .core import Capture, MJPEGFrames, Server
-from .utils import Errors, InitializationError
+from .core import (
+    Capture,
+    FileSource,
+    MJPEGFrames,
+    Pipeline,
+    Relay,
+    Server,
+    Source,
+    Supervisor,
+)
+from .utils import ConfigurationError, Errors, InitializationError
 
 __all__ = [
     "core",
@@ -10,6 +19,12 @@ __all__ = [
     "Capture",
     "MJPEGFrames",
     "Server",
+    "Relay",
+    "FileSource",
+    "Pipeline",
+    "Supervisor",
+    "Source",
     "Errors",
     "InitializationError",
+    "ConfigurationError",
 ]
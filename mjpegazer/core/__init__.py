@@ -2,8 +2,42 @@
 
 """Core functionality"""
 
+from .admission import Admission, AdmissionError
 from .capture import Capture
+from .filesource import FileSource
 from .mjpeg import MJPEGFrames
+from .relay import Relay
 from .rest import Server
+from .supervisor import FrameSlot, SharedFrames, Source, Supervisor
+from .transforms import (
+    Crop,
+    Flip,
+    Grayscale,
+    Pipeline,
+    Resize,
+    Rotate,
+    Timestamp,
+    Transform,
+)
 
-__all__ = ["Capture", "MJPEGFrames", "Server"]
+__all__ = [
+    "Capture",
+    "MJPEGFrames",
+    "Server",
+    "Relay",
+    "FileSource",
+    "Supervisor",
+    "Admission",
+    "AdmissionError",
+    "Source",
+    "FrameSlot",
+    "SharedFrames",
+    "Transform",
+    "Pipeline",
+    "Flip",
+    "Rotate",
+    "Crop",
+    "Resize",
+    "Grayscale",
+    "Timestamp",
+]
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+
+"""Viewer admission control"""
+
+from __future__ import annotations
+
+import math
+from hmac import compare_digest
+from itertools import count
+from threading import Event, Lock
+from typing import Any, ByteString, Iterable, Mapping, Optional
+
+from mjpegazer.utils import ConfigurationError, Errors, get_logger, typechecked
+from mjpegazer.utils.constants import (
+    DEFAULT_VIEWER_CLASS,
+    MAX_STREAM_VIEWERS,
+    MAX_VIEWERS,
+    RETRY_AFTER,
+    VIEWER_CLASSES,
+    VIEWER_TOKENS,
+)
+
+logger = get_logger(__name__)
+
+
+class AdmissionError(Errors):
+    """Viewer refused, the server is at capacity"""
+
+    def __init__(self, message: str, retry_after: int = RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _pairs(value: str) -> dict[str, str]:
+    """Parse a whitespace separated list of `key=value` pairs"""
+    pairs: dict[str, str] = {}
+    for item in value.split():
+        key, _, val = item.partition("=")
+        if not key or not val:
+            raise ConfigurationError(f"Invalid key=value pair: {item}")
+        pairs[key] = val
+    return pairs
+
+
+@typechecked
+class Viewer:
+    """An admitted viewer of a stream
+
+    Parameters
+    ----------
+    stream : str
+        Name of the stream
+    viewer_class : str
+        Name of the priority class
+    priority : int
+        Priority of the class, higher is more important
+    order : int
+        Order of admission
+    """
+
+    def __init__(self, stream: str, viewer_class: str, priority: int, order: int):
+        self.stream = stream
+        self.viewer_class = viewer_class
+        self.priority = priority
+        self.order = order
+        self.evicted = Event()
+
+
+@typechecked
+class Admission:
+    """Limits the number of concurrent viewers, globally and per stream
+
+    A viewer over a limit is refused right away (`AdmissionError`),
+    unless there are viewers of a lower priority class,
+    in which case the lowest priority (and most recently admitted) of those is evicted.
+    An evicted viewer's stream ends after the frame it is being sent.
+
+    The priority class of a viewer is the class of its bearer token (`VIEWER_TOKENS`),
+    or the class asked for in the `X-Viewer-Class` header,
+    if its priority isn't higher than that of the `DEFAULT_VIEWER_CLASS`
+    (a higher priority takes a token).
+    Otherwise it is the `DEFAULT_VIEWER_CLASS`.
+
+    The viewers are counted per process,
+    with several HTTP worker processes the limits apply to each of them.
+
+    Parameters
+    ----------
+    max_viewers : int
+        Concurrent viewers in total, `0` for unlimited
+    max_stream_viewers : int
+        Concurrent viewers per stream, `0` for unlimited
+    classes : Mapping[str, int]
+        Priority per class name
+    tokens : Mapping[str, str]
+        Bearer token per class name
+    default_class : str
+        Class of viewers without token
+
+    Usage
+    -----
+    >>> admission = Admission(max_viewers=10)
+    >>> viewer = admission.admit("live", admission.classify(request.headers))
+    >>> Response(admission.watch(viewer, frames), ...)
+    """
+
+    HEADER: str = "X-Viewer-Class"
+
+    # pylint: disable=too-many-arguments
+
+    def __init__(
+        self,
+        max_viewers: int = MAX_VIEWERS,
+        max_stream_viewers: int = MAX_STREAM_VIEWERS,
+        classes: Optional[Mapping[str, int]] = None,
+        tokens: Optional[Mapping[str, str]] = None,
+        default_class: str = DEFAULT_VIEWER_CLASS,
+    ):
+        if classes is None:
+            classes = {k: int(v) for k, v in _pairs(VIEWER_CLASSES).items()}
+        if tokens is None:
+            tokens = _pairs(VIEWER_TOKENS)
+        unknown = ({default_class} | set(tokens)) - set(classes)
+        if unknown:
+            raise ConfigurationError(
+                f"Unknown viewer class: {', '.join(sorted(unknown))}"
+            )
+        self.max_viewers = max_viewers
+        self.max_stream_viewers = max_stream_viewers
+        self.classes = dict(classes)
+        self.tokens = dict(tokens)
+        self.default_class = default_class
+        self.limits: dict[str, int] = {}
+        self.viewers: list[Viewer] = []
+        self._lock = Lock()
+        self._order = count()
+
+    def limit(self, stream: str, max_viewers: int) -> None:
+        """Override the viewer limit of a stream
+
+        Parameters
+        ----------
+        stream : str
+            Name of the stream
+        max_viewers : int
+            Concurrent viewers of the stream, `0` for unlimited
+        """
+        self.limits[stream] = max_viewers
+
+    def classify(self, headers: Any) -> str:
+        """Determine the class of a viewer from its request headers
+
+        Parameters
+        ----------
+        headers : Any
+            The request headers, anything with a `get` like `flask.request.headers`
+            (which isn't a `Mapping`)
+
+        Returns
+        -------
+        str
+            Name of the class
+        """
+        scheme, _, token = headers.get("Authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and token:
+            for viewer_class, secret in self.tokens.items():
+                if compare_digest(token.encode(), secret.encode()):
+                    return viewer_class
+        requested = headers.get(self.HEADER, "")
+        if self.classes.get(requested, math.inf) <= self.classes[self.default_class]:
+            return requested
+        return self.default_class
+
+    def capacity(self, stream: Optional[str] = None) -> tuple[int, int]:
+        """Number of viewers and the limit (`0`: unlimited)
+
+        Parameters
+        ----------
+        stream : Optional[str]
+            Name of the stream, in total if `None`
+
+        Returns
+        -------
+        tuple[int, int]
+            Viewers and maximum viewers
+        """
+        with self._lock:
+            if stream is None:
+                return len(self.viewers), self.max_viewers
+            viewers = sum(1 for i in self.viewers if i.stream == stream)
+            return viewers, self.limits.get(stream, self.max_stream_viewers)
+
+    def admit(self, stream: str, viewer_class: str) -> Viewer:
+        """Admit a viewer, evicting lower priority viewers if needed
+
+        Parameters
+        ----------
+        stream : str
+            Name of the stream
+        viewer_class : str
+            Name of the class of the viewer
+
+        Returns
+        -------
+        Viewer
+            The admitted viewer, `release` it when done
+
+        Raises
+        ------
+        AdmissionError
+            If the viewer can't be admitted
+        """
+        priority = self.classes[viewer_class]
+        stream_limit = self.limits.get(stream, self.max_stream_viewers)
+        with self._lock:
+            remaining = list(self.viewers)
+            evict: list[Viewer] = []
+            while True:
+                in_stream = [i for i in remaining if i.stream == stream]
+                if stream_limit and len(in_stream) >= stream_limit:
+                    scope = in_stream
+                elif self.max_viewers and len(remaining) >= self.max_viewers:
+                    scope = remaining
+                else:
+                    break
+                candidates = [i for i in scope if i.priority < priority]
+                if not candidates:
+                    raise AdmissionError(
+                        f"No capacity for a {viewer_class} viewer of {stream!r}"
+                    )
+                victim = min(candidates, key=lambda i: (i.priority, -i.order))
+                remaining.remove(victim)
+                evict.append(victim)
+            for victim in evict:
+                logger.info(
+                    "evicting a %s viewer of %r", victim.viewer_class, victim.stream
+                )
+                victim.evicted.set()
+            viewer = Viewer(stream, viewer_class, priority, next(self._order))
+            self.viewers = remaining + [viewer]
+            return viewer
+
+    def release(self, viewer: Viewer) -> None:
+        """Release a viewer (no-op if it has been evicted)
+
+        Parameters
+        ----------
+        viewer : Viewer
+            The admitted viewer
+        """
+        with self._lock:
+            if viewer in self.viewers:
+                self.viewers.remove(viewer)
+
+    def watch(
+        self, viewer: Viewer, frames: Iterable[ByteString]
+    ) -> Iterable[ByteString]:
+        """Stream frames to an admitted viewer until it disconnects or is evicted
+
+        The viewer is released once the frames end,
+        release it as well when they may never be iterated
+        (i.e. a HEAD request, see `flask.Response.call_on_close`).
+
+        Parameters
+        ----------
+        viewer : Viewer
+            The admitted viewer
+        frames : Iterable[ByteString]
+            i.e. an MJPEGFrames object
+
+        Yields
+        ------
+        ByteString
+            The frames
+        """
+        iterator = iter(frames)
+        try:
+            for frame in iterator:
+                if viewer.evicted.is_set():
+                    break
+                yield frame
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()  # i.e. release the capture (and its lock)
+            self.release(viewer)
@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+
+"""Pre-encoded, looping video file source"""
+
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import math
+import mmap
+import os
+from contextlib import AbstractContextManager, suppress
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from threading import Event, Lock, Thread
+from time import sleep, time
+from types import TracebackType
+from typing import Any, Optional, Tuple
+
+import cv2
+from numpy import array, frombuffer, generic, memmap, ndarray, uint8
+
+from mjpegazer.utils import InitializationError, get_logger, typechecked
+from mjpegazer.utils.constants import CACHE_DIR
+
+logger = get_logger(__name__)
+
+
+def _sha256(path: Path) -> str:
+    """Hash a file's content"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@typechecked
+class FileSourceStream:
+    """A viewer's side of a `FileSource`, in place of a `cv2.VideoCapture`
+
+    `read_encoded()` returns the cached JPEG images as is,
+    `read()` decodes them, for when the frames have to be transformed.
+    """
+
+    # pylint: disable=invalid-name
+
+    def __init__(self, source: FileSource):
+        self._source = source
+        self._index = -1
+
+    def isOpened(self) -> bool:
+        """Always True, the file is played in a loop"""
+        return True
+
+    def read_encoded(self) -> Tuple[bool, bytes, float]:
+        """Wait for the next frame
+
+        Returns
+        -------
+        Tuple[bool, bytes, float]
+            Success, the JPEG image and the time it is (re)played at,
+            no success while the cache is being built.
+        """
+        source = self._source
+        if not source.ready.wait(source.WAIT):
+            return False, b"", 0.0
+        index = source.position()
+        if index == self._index:  # wait for the next frame
+            index += 1
+            sleep(max(0.0, source.epoch + index / source.fps - time()))
+        self._index = index
+        return True, source.frame(index), source.epoch + index / source.fps
+
+    def read(self) -> Tuple[bool, Optional[ndarray[int, generic]]]:
+        """Wait for the next frame and decode it
+
+        Returns
+        -------
+        Tuple[bool, Optional[ndarray]]
+            Success and the frame
+        """
+        ret, jpeg, _ = self.read_encoded()
+        if not ret:
+            return False, None
+        frame = cv2.imdecode(frombuffer(jpeg, uint8), cv2.IMREAD_COLOR)
+        return frame is not None, frame
+
+    def release(self) -> None:
+        """Nothing to release, the cache stays mapped for the next viewer"""
+
+
+@typechecked
+class FileSource(AbstractContextManager):
+    """FileSource is a `Capture` compatible source that plays a video file in a loop.
+
+    The file is decoded and encoded once, into a cache of JPEG images
+    (`<key>.data`) with an index of their offsets (`<key>.index`),
+    both are memory-mapped.
+    The cache is rebuilt when the file's modification time, size or content changes,
+    as recorded in `<key>.json`, or when it is incomplete.
+    It is built in a background thread (`load`), reads fail until it is ready,
+    a rebuilt cache replaces the old one once it is ready.
+    Loading is serialized across processes (`<key>.lock`),
+    a process that finds a cache being built waits for it, instead of building it too.
+
+    Playback follows the wall clock at the file's frame rate,
+    so all viewers see the same frame at the same time, without any capturing.
+
+    The `video_url` is the path of the file prefixed with `cache+`,
+    i.e. `cache+/videos/demo.mp4`.
+
+    Parameters
+    ----------
+    video_url : str
+        The path of the video file
+    cache_dir : str
+        Directory to keep the cache in
+
+    Usage:
+    ```python
+    Server.configure("cache+/videos/demo.mp4")  # starts building the cache
+    app = Server.flask(__name__)
+    ```
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    SCHEME: str = "cache+"
+    DEFAULT_FPS: float = 25.0
+    WAIT: float = 1.0  # seconds a read waits for the cache to be ready
+
+    fps: float = DEFAULT_FPS
+    epoch: float = 0.0  # start of the first loop
+    _mapped: Optional[Tuple[mmap.mmap, Any]] = None  # encoded frames and their offsets
+    _modified: Tuple[int, int] = (0, 0)  # modification time and size of the cached file
+
+    def __init__(self, video_url: str, cache_dir: str = CACHE_DIR):
+        self.path = Path(
+            video_url[len(self.SCHEME) :] if self.handles(video_url) else video_url
+        )
+        key = hashlib.sha256(str(self.path.resolve()).encode()).hexdigest()[:32]
+        self.cache = Path(cache_dir).expanduser() / key
+        self.ready = Event()  # the cache is mapped
+        self._lock = Lock()
+        self._loader: Optional[Thread] = None
+
+    @classmethod
+    def handles(cls, video_url: str) -> bool:
+        """Whether the URL is a cached file URL"""
+        return video_url.startswith(cls.SCHEME)
+
+    def __enter__(self) -> FileSourceStream:
+        """(Re)load the cache in the background if it isn't loaded or the file changed
+
+        Returns
+        -------
+        FileSourceStream
+            A VideoCapture like object
+        """
+        if self._mapped is None or self._changed():
+            self.load()
+        return FileSourceStream(self)
+
+    def load(self, block: bool = False) -> None:
+        """Map the cache in a background thread, (re)build it if it is missing or stale
+
+        Nothing is started while the cache is being loaded already.
+
+        Parameters
+        ----------
+        block : bool
+            Wait until the cache has been loaded (or failed to)
+        """
+        with self._lock:
+            if self._loader is None or not self._loader.is_alive():
+                self._loader = Thread(
+                    target=self._background, name="filesource", daemon=True
+                )
+                self._loader.start()
+            loader = self._loader
+        if block:
+            loader.join()
+
+    def __exit__(
+        self,
+        exc_type: Optional[BaseException],
+        exc_val: Optional[Exception],
+        exc_tb: Optional[TracebackType],
+    ) -> bool:
+        """Context manager exit method.
+
+        Returns
+        -------
+        bool
+            Always True, indicating exceptions should be suppressed.
+        """
+        exc_info = (exc_type, exc_val, exc_tb)
+        if None not in exc_info:
+            logger.warning(
+                "Failed playing frames!",
+                exc_info=exc_info,
+            )
+        return True
+
+    def position(self) -> int:
+        """Index of the frame that is playing now (not wrapped around)"""
+        return math.floor((time() - self.epoch) * self.fps)
+
+    def frame(self, index: int) -> bytes:
+        """JPEG image at an index, wrapped around
+
+        Parameters
+        ----------
+        index : int
+            Index of the frame
+
+        Returns
+        -------
+        bytes
+            The JPEG image
+        """
+        data, offsets = self._mapped
+        index %= len(offsets) - 1
+        return data[int(offsets[index]) : int(offsets[index + 1])]
+
+    def _changed(self) -> bool:
+        """Whether the file's modification time or size changed since it was cached"""
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return False  # keep playing the cache
+        return (stat.st_mtime_ns, stat.st_size) != self._modified
+
+    def _stat(self) -> dict[str, Any]:
+        """Modification time, size and hash of the file"""
+        try:
+            stat = self.path.stat()
+            return {
+                "path": str(self.path),
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "sha256": _sha256(self.path),
+            }
+        except OSError as _e:
+            raise InitializationError(f"Video file not available: {_e}") from _e
+
+    def _background(self) -> None:
+        """Load the cache, log why it failed"""
+        try:
+            self._load()
+        except (InitializationError, OSError) as _e:
+            logger.error("%s: %s", self.path, _e)
+
+    def _load(self) -> None:
+        """Map the cache, (re)building it if it is missing or stale"""
+        self.cache.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.cache.with_suffix(".lock"), "a", encoding="utf-8") as lock:
+            # held by the process, not inherited when forked
+            fcntl.lockf(lock, fcntl.LOCK_EX)
+            self._locked()
+
+    def _locked(self) -> None:
+        """Map the cache, (re)building it, while holding the lock"""
+        stat = self._stat()
+        meta = self.cache.with_suffix(".json")
+        try:
+            cached = json.loads(meta.read_text())
+        except (OSError, ValueError):
+            cached = {}
+        mapped = None
+        if {k: cached.get(k, None) for k in stat} == stat:
+            mapped = self._map(cached)
+        if mapped is None:
+            logger.info("%s: encoding into %s", self.path, self.cache)
+            cached = self._build(stat)
+            mapped = self._map(cached)
+        if mapped is None:
+            raise InitializationError(f"Video file cache not readable: {self.cache}")
+        self.fps = cached["fps"]
+        self.epoch = self.epoch or time()
+        self._modified = (stat["mtime_ns"], stat["size"])
+        self._mapped = mapped  # at once, viewers may be reading
+        self.ready.set()
+
+    def _map(self, cached: dict[str, Any]) -> Optional[Tuple[mmap.mmap, Any]]:
+        """Map the encoded frames and their offsets, None if missing or incomplete"""
+        try:
+            with open(self.cache.with_suffix(".data"), "rb") as file:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            offsets = memmap(self.cache.with_suffix(".index"), dtype="<u8", mode="r")
+        except (OSError, ValueError) as _e:
+            logger.warning("%s: cache incomplete, %s", self.path, _e)
+            return None
+        frames = cached.get("frames", -1)
+        if len(offsets) != frames + 1 or int(offsets[-1]) != len(data):
+            logger.warning("%s: cache incomplete", self.path)
+            return None
+        return data, offsets
+
+    def _build(self, stat: dict[str, Any]) -> dict[str, Any]:
+        """Decode the file and write the encoded frames, their offsets and the metadata
+
+        Every file is written next to its destination first and then moved,
+        the metadata last, so a cache is either complete or rebuilt.
+        """
+        # pylint: disable=no-member
+        self.cache.parent.mkdir(parents=True, exist_ok=True)
+        capture = cv2.VideoCapture(str(self.path), cv2.CAP_FFMPEG)
+        try:
+            if not capture.isOpened():
+                raise InitializationError(f"Video file not readable: {self.path}")
+            fps = capture.get(cv2.CAP_PROP_FPS)
+            fps = fps if fps and math.isfinite(fps) and fps > 0 else self.DEFAULT_FPS
+            offsets = [0]
+            frame: Optional[ndarray[int, generic]] = None
+            temporary: list[str] = []  # removed on failure
+            try:
+                with NamedTemporaryFile(dir=self.cache.parent, delete=False) as data:
+                    temporary.append(data.name)
+                    ret, frame = capture.read()
+                    while ret:
+                        jpeg = cv2.imencode(".jpg", frame)[1]
+                        data.write(jpeg.data)
+                        offsets.append(offsets[-1] + jpeg.nbytes)
+                        ret, frame = capture.read(image=frame)
+                if len(offsets) < 2:
+                    raise InitializationError(f"Video file has no frames: {self.path}")
+                with NamedTemporaryFile(dir=self.cache.parent, delete=False) as index:
+                    temporary.append(index.name)
+                    array(offsets, dtype="<u8").tofile(index)
+                cached = {**stat, "fps": fps, "frames": len(offsets) - 1}
+                with NamedTemporaryFile(
+                    "w", dir=self.cache.parent, delete=False
+                ) as meta:
+                    temporary.append(meta.name)
+                    json.dump(cached, meta)
+                os.replace(data.name, self.cache.with_suffix(".data"))
+                os.replace(index.name, self.cache.with_suffix(".index"))
+                os.replace(meta.name, self.cache.with_suffix(".json"))
+            except BaseException:
+                for name in temporary:
+                    with suppress(FileNotFoundError):
+                        os.unlink(name)  # unless it has been moved already
+                raise
+        finally:
+            capture.release()
+        return cached
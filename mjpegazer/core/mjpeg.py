@@ -5,19 +5,66 @@
 from __future__ import annotations
 
 from contextlib import AbstractContextManager
-from typing import ByteString, Iterable, Union
+from time import sleep, time
+from typing import ByteString, Iterable, Optional, Union
 
 import cv2
 from numpy import generic, ndarray
 
-from mjpegazer.utils import get_logger, typechecked
-from mjpegazer.utils.constants import HEALTH_THRESHOLD, MIRROR_IMAGE
+from mjpegazer.utils import Profiler, get_logger, typechecked
+from mjpegazer.utils.constants import FAILURE_BACKOFF, HEALTH_THRESHOLD
 
 from .capture import Capture
+from .transforms import Pipeline
 
 logger = get_logger(__name__)
 
 
+def multipart(jpeg: bytes, timestamp: float) -> bytes:
+    """
+    Package a JPEG image as a part of an HTTP MJPEG multipart stream.
+
+    Parameters
+    ----------
+    jpeg : bytes
+        The encoded image.
+    timestamp : float
+        Unix time at which the image was captured, sent as `X-Timestamp`.
+
+    Returns
+    -------
+    bytes
+        The part, with '--frame' boundry in header.
+    """
+    return (
+        b"--frame\r\n"
+        + b"Content-Type: image/jpeg\r\n"
+        + b"Content-Length: %d\r\n" % len(jpeg)
+        + b"X-Timestamp: %.6f\r\n\r\n" % timestamp
+        + jpeg
+        + b"\r\n"
+    )
+
+
+def _ended(cap: cv2.VideoCapture) -> bool:
+    """
+    Whether a video file has been played to its end, live sources never end.
+
+    Parameters
+    ----------
+    cap : cv2.VideoCapture
+        The capture that failed to read.
+
+    Returns
+    -------
+    bool
+        True if all frames of the file have been read.
+    """
+    # pylint: disable=no-member
+    frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    return frames > 0 and cap.get(cv2.CAP_PROP_POS_FRAMES) >= frames
+
+
 @typechecked
 class MJPEGFrames:
     """MJPEG http multipart 'parts'
@@ -48,6 +95,10 @@ class MJPEGFrames:
     healthy : bool
         Video Capturerer Health
 
+    The stream ends at the end of a video file,
+    or after `HEALTH_THRESHOLD` consecutive failed reads,
+    which are retried every `FAILURE_BACKOFF` seconds.
+
 
     Yields
     ------
@@ -84,9 +135,14 @@ class MJPEGFrames:
     """
 
     capture_object: Union[Capture, AbstractContextManager]
+    transforms: Pipeline
     _failures: int = 0
 
-    def __init__(self, capture_object: Union[Capture, AbstractContextManager]):
+    def __init__(
+        self,
+        capture_object: Union[Capture, AbstractContextManager],
+        transforms: Optional[Pipeline] = None,
+    ):
         """
         Initialize an MJPEGFrames object.
 
@@ -94,8 +150,14 @@ class MJPEGFrames:
         ----------
         capture_object : Capture
             A Capture object.
+        transforms : Optional[Pipeline]
+            Transforms applied to every frame before encoding,
+            defaults to the pipeline configured by the environment.
         """
         self.capture_object = capture_object
+        if transforms is None:
+            transforms = Pipeline.default()
+        self.transforms = transforms
 
     def __iter__(self) -> Iterable[ByteString]:
         """
@@ -108,29 +170,45 @@ class MJPEGFrames:
         """
         ## ------------------- NOTE ---------- ##
         ## For the typechecking, linting, etc  ##
-        frame: ndarray[int, generic]
-        jpeg: ndarray[int, generic]
+        frame: Optional[ndarray[int, generic]] = None
+        data: bytes
+        timestamp: float
+        failures = 0
         # pylint: disable=no-member
         ## ----------------------------------- ##
 
+        # the buffers of a pipeline can't be shared by viewers
+        transforms = self.transforms.copy()
         with self.capture_object as cap:  # get the cv2.VideoCapture object from the context manager
+            # decode into the previous frame's buffer
+            reuse = isinstance(cap, cv2.VideoCapture)
+            # i.e. a Relay, sent as is
+            encoded = not transforms and hasattr(cap, "read_encoded")
             while cap.isOpened():
+                Profiler.checkpoint()
                 try:
-                    ret, frame = cap.read()
-                    if ret is None:  # check if there is a frame in the buffer
+                    if encoded:
+                        ret, data, timestamp = cap.read_encoded()
+                    else:
+                        ret, frame = cap.read(image=frame) if reuse else cap.read()
+                    if not ret:  # check if there is a frame in the buffer
                         self._failures += 1  # Report failure to the health check
+                        failures += 1  # of this viewer
                         logger.debug("Failed to capture frame")
+                        if reuse and _ended(cap):
+                            break  # end of the file
+                        if failures >= HEALTH_THRESHOLD:
+                            logger.warning(
+                                "Failed to capture %s frames, ending", failures
+                            )
+                            break
+                        sleep(FAILURE_BACKOFF)
                         continue  # finish this loop
-                    self._failures = 0  # Reset health counter
-                    if MIRROR_IMAGE:
-                        frame = cv2.flip(frame, 1)
-                    jpeg = cv2.imencode(".jpg", frame)[1]
-                    yield (  # Yield payload with '--frame' boundry in header
-                        b"--frame\r\n"
-                        + b"Content-Type: image/jpeg\r\n\r\n"
-                        + jpeg.tobytes()
-                        + b"\r\n"
-                    )
+                    if not encoded:
+                        timestamp = time()
+                        data = cv2.imencode(".jpg", transforms(frame))[1].tobytes()
+                    self._failures = failures = 0  # Reset health counter
+                    yield multipart(data, timestamp)
                 except GeneratorExit:
                     break  # graceful exit
 
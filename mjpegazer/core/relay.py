@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+
+"""Relay of another MJPEGazer's stream"""
+
+from __future__ import annotations
+
+from contextlib import AbstractContextManager
+from http.client import HTTPException
+from threading import Condition, Event, Thread
+from time import time
+from types import TracebackType
+from typing import BinaryIO, Iterator, Optional, Tuple
+from urllib.request import urlopen
+
+import cv2
+from numpy import frombuffer, generic, ndarray, uint8
+
+from mjpegazer.utils import Profiler, get_logger, typechecked
+from mjpegazer.utils.constants import RELAY_RECONNECT, RELAY_TIMEOUT
+
+logger = get_logger(__name__)
+
+
+def parts(
+    stream: BinaryIO, boundary: bytes = b"frame"
+) -> Iterator[Tuple[bytes, float]]:
+    """Parse an HTTP MJPEG multipart stream
+
+    Parameters
+    ----------
+    stream : BinaryIO
+        The response body
+    boundary : bytes
+        The multipart boundary
+
+    Yields
+    ------
+    Tuple[bytes, float]
+        The JPEG image and its `X-Timestamp` (the time of arrival if there is none)
+    """
+    delimiter = b"--" + boundary
+    line = stream.readline()
+    while line:
+        if not line.startswith(delimiter):
+            line = stream.readline()
+            continue
+        if line.rstrip() == delimiter + b"--":
+            return  # closing delimiter
+        headers: dict[bytes, bytes] = {}
+        line = stream.readline()
+        while line.strip():
+            key, _, value = line.partition(b":")
+            headers[key.strip().lower()] = value.strip()
+            line = stream.readline()
+        if not line:
+            return
+        if b"content-length" in headers:
+            length = int(headers[b"content-length"])
+            jpeg = stream.read(length)
+            if len(jpeg) < length:
+                return
+            line = stream.readline()
+        else:  # up to the next delimiter
+            chunks = []
+            line = stream.readline()
+            while line and not line.startswith(delimiter):
+                chunks.append(line)
+                line = stream.readline()
+            jpeg = b"".join(chunks)
+            if jpeg.endswith(b"\r\n"):
+                jpeg = jpeg[:-2]
+        yield jpeg, float(headers.get(b"x-timestamp", time()))
+
+
+@typechecked
+class RelayStream:
+    """A viewer's side of a `Relay`, in place of a `cv2.VideoCapture`
+
+    `read_encoded()` returns the origin's JPEG images as is,
+    `read()` decodes them, for when the frames have to be transformed.
+    """
+
+    # pylint: disable=invalid-name
+
+    def __init__(self, relay: Relay):
+        self._relay = relay
+        self._sequence = relay.sequence
+
+    def isOpened(self) -> bool:
+        """Whether the relay is (still) subscribed"""
+        return self._relay.subscribed
+
+    def read_encoded(self) -> Tuple[bool, bytes, float]:
+        """Wait for the next frame of the origin
+
+        Returns
+        -------
+        Tuple[bool, bytes, float]
+            Success, the JPEG image and the time it was captured
+        """
+        frame = self._relay.next(self._sequence)
+        if frame is None:
+            return False, b"", 0.0
+        self._sequence, jpeg, timestamp = frame
+        return True, jpeg, timestamp
+
+    def read(self) -> Tuple[bool, Optional[ndarray[int, generic]]]:
+        """Wait for the next frame of the origin and decode it
+
+        Returns
+        -------
+        Tuple[bool, Optional[ndarray]]
+            Success and the frame
+        """
+        ret, jpeg, _ = self.read_encoded()
+        if not ret:
+            return False, None
+        frame = cv2.imdecode(frombuffer(jpeg, uint8), cv2.IMREAD_COLOR)
+        return frame is not None, frame
+
+    def release(self) -> None:
+        """Nothing to release, the relay unsubscribes when its last viewer leaves"""
+
+
+@typechecked
+class Relay(AbstractContextManager):
+    """Relay is a `Capture` compatible source of another MJPEGazer's stream.
+
+    The origin's stream is subscribed to once, while there are viewers,
+    and its frames (and timestamps) are shared by all of them as is,
+    without decoding and encoding.
+    When the connection drops the relay reconnects.
+
+    The `video_url` is the URL of the origin's stream,
+    prefixed with `relay+`, i.e. `relay+http://origin:5000/live`.
+
+    Parameters
+    ----------
+    video_url : str
+        The URL of the origin's stream
+    timeout : float
+        Seconds without frames before a viewer's read fails
+    reconnect : float
+        Seconds between connection attempts
+
+    Usage:
+    ```python
+    Server.configure("relay+http://origin:5000/live")
+    app = Server.flask(__name__)
+    ```
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    SCHEME: str = "relay+"
+
+    def __init__(
+        self,
+        video_url: str,
+        timeout: float = RELAY_TIMEOUT,
+        reconnect: float = RELAY_RECONNECT,
+    ):
+        self.origin = (
+            video_url[len(self.SCHEME) :] if self.handles(video_url) else video_url
+        )
+        self.timeout = timeout
+        self.reconnect = reconnect
+        self.sequence = 0
+        self._frame: Optional[Tuple[int, bytes, float]] = None
+        self._viewers = 0
+        self._condition = Condition()
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    @classmethod
+    def handles(cls, video_url: str) -> bool:
+        """Whether the URL is a relay URL"""
+        return video_url.startswith(cls.SCHEME)
+
+    @property
+    def subscribed(self) -> bool:
+        """Whether the origin is subscribed to"""
+        return self._thread is not None and not self._stop.is_set()
+
+    def __enter__(self) -> RelayStream:
+        """Subscribe a viewer, subscribes to the origin if it is the first
+
+        Returns
+        -------
+        RelayStream
+            A VideoCapture like object
+        """
+        with self._condition:
+            self._viewers += 1
+            if self._thread is None:
+                # the previous subscription may still be winding down
+                self._stop = Event()
+                self._thread = Thread(target=self._subscribe, name="relay", daemon=True)
+                self._thread.start()
+            return RelayStream(self)
+
+    def __exit__(
+        self,
+        exc_type: Optional[BaseException],
+        exc_val: Optional[Exception],
+        exc_tb: Optional[TracebackType],
+    ) -> bool:
+        """Unsubscribe a viewer, unsubscribes from the origin if it was the last
+
+        Returns
+        -------
+        bool
+            Always True, indicating exceptions should be suppressed.
+        """
+        exc_info = (exc_type, exc_val, exc_tb)
+        with self._condition:
+            self._viewers -= 1
+            if not self._viewers:
+                self._stop.set()
+                self._thread = None
+                self._condition.notify_all()
+        if None not in exc_info:
+            logger.warning(
+                "Failed relaying frames!",
+                exc_info=exc_info,
+            )
+        return True
+
+    def next(self, after: int) -> Optional[Tuple[int, bytes, float]]:
+        """Wait for a frame newer than `after`
+
+        Parameters
+        ----------
+        after : int
+            Sequence number of the last frame that has been read
+
+        Returns
+        -------
+        Optional[Tuple[int, bytes, float]]
+            The sequence number, JPEG image and timestamp, None on timeout
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self.sequence > after or self._stop.is_set(),
+                self.timeout,
+            )
+            if self.sequence > after:
+                return self._frame
+            return None
+
+    def _subscribe(self) -> None:
+        """Receive the origin's frames until the last viewer leaves"""
+        stop = self._stop  # this subscription's
+        while not stop.is_set():
+            try:
+                with urlopen(self.origin, timeout=self.timeout) as response:
+                    content_type = response.headers.get("Content-Type", "")
+                    _, _, boundary = content_type.partition("boundary=")
+                    delimiter = boundary.strip('"').encode() or b"frame"
+                    logger.info("relaying %s", self.origin)
+                    for jpeg, timestamp in parts(response, delimiter):
+                        if stop.is_set():
+                            return
+                        Profiler.checkpoint()
+                        with self._condition:
+                            self.sequence += 1
+                            self._frame = (self.sequence, jpeg, timestamp)
+                            self._condition.notify_all()
+                logger.warning("%s: stream ended", self.origin)
+            except (OSError, HTTPException, ValueError) as _e:
+                logger.warning("%s: %s", self.origin, _e)
+            stop.wait(self.reconnect)
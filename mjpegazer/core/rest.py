@@ -4,14 +4,36 @@
 
 from __future__ import annotations
 
+import math
+import os
+from functools import partial
+from hmac import compare_digest
+from multiprocessing import parent_process
 from threading import Lock
+from typing import ByteString, Iterable, Optional
 
-from flask import Flask, Response
+from flask import Flask, Response, abort, request
 
-from mjpegazer.utils import get_logger, typechecked
+from mjpegazer.utils import (
+    ConfigurationError,
+    Profiler,
+    ProfilingError,
+    get_logger,
+    typechecked,
+)
+from mjpegazer.utils.constants import (
+    ADMIN_TOKEN,
+    PROFILE_MAX_DURATION,
+    SUPERVISOR_INTERVAL,
+)
 
+from .admission import Admission, AdmissionError
 from .capture import Capture
+from .filesource import FileSource
 from .mjpeg import MJPEGFrames
+from .relay import Relay
+from .supervisor import Source, Supervisor
+from .transforms import Pipeline
 
 LOCK = Lock()
 
@@ -30,6 +52,10 @@ class Server:
     ----------
     MJPEG: MJPEGFrames
         A MJPEGFrames object which generates the MJPEG video frames to be streamed by the server.
+    SUPERVISOR: Optional[Supervisor]
+        A Supervisor whose sources are served at '<live_route>/<name>'.
+    ADMISSION: Admission
+        Limits the concurrent viewers of the streams.
 
     Usage
     -----
@@ -40,23 +66,69 @@ class Server:
     """
 
     MJPEG: MJPEGFrames
+    SUPERVISOR: Optional[Supervisor] = None
+    ADMISSION: Admission = Admission()
+    DEFAULT_STREAM: str = ""  # admission name of the stream at '<live_route>'
 
     @classmethod
-    def configure(cls, video_url: str, lock: Lock = LOCK) -> None:
+    def configure(
+        cls,
+        video_url: str,
+        lock: Lock = LOCK,
+        transforms: Optional[Pipeline] = None,
+    ) -> None:
         """
         Configures the Server class by initializing a MJPEGFrames object.
 
         Parameters
         ----------
         video_url : str
-            The URL of the video source to stream.
+            The URL of the video source to stream,
+            or of another MJPEGazer's stream to relay, prefixed with 'relay+',
+            or the path of a video file to cache and play in a loop, prefixed with 'cache+'.
         lock : Lock
             A threading.Lock object to ensure thread safety.
             Default LOCK is used if not provided,
-            Can be set to `None`.
+            Can be set to `None`. Not used when relaying or playing a cached file.
+        transforms : Optional[Pipeline]
+            Transforms applied to every frame,
+            defaults to the pipeline configured by the environment.
+
+        Notes
+        -----
+        With a lock there can only be one viewer at a time,
+        others are refused instead of waiting for the lock.
+        """
+        if Relay.handles(video_url):
+            capture_object = Relay(video_url)  # shared by all viewers
+            lock = None
+        elif FileSource.handles(video_url):
+            capture_object = FileSource(video_url)  # shared by all viewers
+            # not in a capture worker, which imports the application again
+            if parent_process() is None:
+                # builds the cache in the background, before the first viewer
+                capture_object.load()
+            lock = None
+        else:
+            capture_object = Capture(video_url, lock)
+        cls.MJPEG = MJPEGFrames(capture_object, transforms)
+        if lock is not None:
+            cls.ADMISSION.limit(cls.DEFAULT_STREAM, 1)
+        else:
+            cls.ADMISSION.limits.pop(cls.DEFAULT_STREAM, None)
+
+    @classmethod
+    def supervise(cls, supervisor: Supervisor) -> None:
+        """
+        Serves the sources of a Supervisor, starting it if it isn't running.
+
+        Parameters
+        ----------
+        supervisor : Supervisor
+            The supervisor of the capture worker processes.
         """
-        capture_object = Capture(video_url, lock)
-        cls.MJPEG = MJPEGFrames(capture_object)
+        supervisor.start()
+        cls.SUPERVISOR = supervisor
 
     @classmethod
     def live(cls) -> Response:
@@ -67,6 +139,7 @@ class Server:
         -------
         Response
             A Flask Response object with the MJPEG video frames as the response data.
+            503 with Retry-After if the viewer isn't admitted.
 
         Notes
         -----
@@ -79,10 +152,7 @@ class Server:
             Though this in turn could be 'negated' by lowering the image qualitity
         """
         try:
-            return Response(
-                cls.MJPEG,
-                mimetype="multipart/x-mixed-replace; boundary=frame",
-            )
+            return cls._admit(cls.DEFAULT_STREAM, cls.MJPEG)
         except Exception as _e:
             logger.exception(_e)
             raise _e from _e
@@ -97,21 +167,240 @@ class Server:
         Response
             A Flask Response object with the health status ("True" or "False") as the response data.
             The HTTP status code is 200 if the video stream is healthy, otherwise it's 503.
+            The viewer capacity is reported in the headers, see `_capacity`.
         """
         try:
             if cls.MJPEG.healthy:
-                return Response("True", status=200)
-            return Response("False", status=503)
+                return Response(
+                    "True", status=200, headers=cls._capacity(cls.DEFAULT_STREAM)
+                )
+            return Response(
+                "False", status=503, headers=cls._capacity(cls.DEFAULT_STREAM)
+            )
         except Exception as _e:
             logger.exception(_e)
             raise _e from _e
 
+    @classmethod
+    def stream(cls, name: str) -> Response:
+        """
+        Returns a Flask Response object that streams the MJPEG frames of a supervised source.
+
+        Parameters
+        ----------
+        name : str
+            The name of the source.
+
+        Returns
+        -------
+        Response
+            A Flask Response object with the MJPEG video frames as the response data.
+            404 if there is no such source, 503 with Retry-After if the viewer isn't admitted.
+        """
+        if cls.SUPERVISOR is None or cls.SUPERVISOR.slot(name) is None:
+            abort(404)
+        return cls._admit(name, cls.SUPERVISOR.frames(name))
+
+    @classmethod
+    def stream_health(cls, name: str) -> Response:
+        """
+        Returns a Flask Response object that indicates the health status of a supervised source.
+
+        Parameters
+        ----------
+        name : str
+            The name of the source.
+
+        Returns
+        -------
+        Response
+            "True" with status 200 if the source is healthy, otherwise "False" with status 503.
+            404 if there is no such source.
+        """
+        slot = None if cls.SUPERVISOR is None else cls.SUPERVISOR.slot(name)
+        if slot is None:
+            abort(404)
+        if slot.healthy:
+            return Response("True", status=200, headers=cls._capacity(name))
+        return Response("False", status=503, headers=cls._capacity(name))
+
+    @classmethod
+    def _admit(cls, stream: str, frames: Iterable[ByteString]) -> Response:
+        """
+        Returns the streaming Response for an admitted viewer, or a 503 with Retry-After.
+        """
+        try:
+            viewer = cls.ADMISSION.admit(
+                stream, cls.ADMISSION.classify(request.headers)
+            )
+        except AdmissionError as _e:
+            logger.debug("%s", _e)
+            return Response(
+                "Too many viewers",
+                status=503,
+                headers={"Retry-After": str(_e.retry_after)},
+            )
+        response = Response(
+            cls.ADMISSION.watch(viewer, frames),
+            mimetype="multipart/x-mixed-replace; boundary=frame",
+        )
+        response.call_on_close(partial(cls.ADMISSION.release, viewer))  # i.e. on HEAD
+        return response
+
+    @classmethod
+    def _capacity(cls, stream: str) -> dict[str, str]:
+        """
+        Returns the viewer capacity as headers, a maximum of 0 means unlimited.
+
+        `X-Viewers`, `X-Viewers-Max`, `X-Stream-Viewers` and `X-Stream-Viewers-Max`
+        """
+        viewers, max_viewers = cls.ADMISSION.capacity()
+        stream_viewers, max_stream_viewers = cls.ADMISSION.capacity(stream)
+        return {
+            "X-Viewers": str(viewers),
+            "X-Viewers-Max": str(max_viewers),
+            "X-Stream-Viewers": str(stream_viewers),
+            "X-Stream-Viewers-Max": str(max_stream_viewers),
+        }
+
+    @classmethod
+    def profile(cls) -> Response:
+        """
+        Profiles all threads of this (HTTP worker) process and returns the result as a file,
+        merged with the profiles of the capture worker processes of a running supervisor.
+
+        Requires the `ADMIN_TOKEN` as bearer token, the endpoint is disabled without one.
+
+        Query parameters:
+            - `mode`: `sample` (default) for a collapsed stack flamegraph file,
+                or `deterministic` for a cProfile pstats file.
+                With a supervisor the stacks start with the process, i.e. `capture-0`.
+            - `duration`: seconds to profile for (default 10, max `PROFILE_MAX_DURATION`).
+            - `interval`: seconds between samples (default 0.005).
+
+        Returns
+        -------
+        Response
+            A Flask Response object with the profile as attachment.
+            400 for an unknown mode or a duration or interval that isn't a positive number,
+            401 without a valid token, 404 if disabled,
+            409 if profiling is already running or not possible.
+        """
+        cls.authorize()
+        mode = request.args.get("mode", "sample")
+        duration = request.args.get("duration", 10.0, type=float)
+        interval = request.args.get("interval", 0.005, type=float)
+        if not all(math.isfinite(i) and i > 0 for i in (duration, interval)):
+            return Response(
+                "The duration and interval must be positive numbers", status=400
+            )
+        duration = min(duration, PROFILE_MAX_DURATION)
+        if mode not in ("sample", "deterministic"):
+            return Response(f"Unknown mode: {mode}", status=400)
+        supervisor = cls.SUPERVISOR
+        if supervisor is not None and not supervisor.running:
+            supervisor = None
+        directory = (
+            None if supervisor is None else supervisor.profile(mode, duration, interval)
+        )
+        try:
+            if mode == "sample":
+                data = Profiler.sample(duration, interval).encode()
+                filename = "profile.collapsed"
+            else:
+                data = Profiler.deterministic(duration)
+                filename = "profile.pstats"
+        except ProfilingError as _e:
+            return Response(str(_e), status=409)
+        finally:
+            profiles = {}
+            if directory is not None:  # the workers finish at about the same time
+                profiles = supervisor.profiles(
+                    directory, Profiler.GRACE + SUPERVISOR_INTERVAL
+                )
+        if profiles:
+            data = Profiler.merge(mode, {f"http-{os.getpid()}": data, **profiles})
+        return Response(
+            data,
+            mimetype="application/octet-stream",
+            headers={"Content-Disposition": f"attachment; filename={filename}"},
+        )
+
+    @classmethod
+    def source(cls, name: str) -> Response:
+        """
+        Adds (PUT) or removes (DELETE) a supervised source at runtime.
+
+        Requires the `ADMIN_TOKEN` as bearer token, the endpoint is disabled without one.
+        A source is added with a JSON body: `{"video_url": "...", "transforms": "..."}`,
+        `transforms` is optional, see `Pipeline.parse`.
+
+        Parameters
+        ----------
+        name : str
+            The name of the source.
+
+        Returns
+        -------
+        Response
+            202 as the supervisor applies the change (asynchronously in a forked HTTP worker).
+            400 for an invalid body, 401 without a valid token, 404 if disabled,
+            if there is no supervisor or when removing an unknown source,
+            409 when adding a source that already exists.
+        """
+        cls.authorize()
+        if cls.SUPERVISOR is None:
+            abort(404)
+        if request.method == "DELETE":
+            if cls.SUPERVISOR.slot(name) is None:
+                abort(404)
+            cls.SUPERVISOR.remove(name)
+            return Response("Accepted", status=202)
+        body = request.get_json(silent=True)
+        video_url = body.get("video_url", None) if isinstance(body, dict) else None
+        transforms = body.get("transforms", "") if isinstance(body, dict) else ""
+        if (
+            not isinstance(video_url, str)
+            or not video_url
+            or not isinstance(transforms, str)
+        ):
+            return Response(
+                "A video_url (and optional transforms) is required", status=400
+            )
+        try:
+            Pipeline.parse(transforms)  # fail here, rather than in the capture worker
+        except ConfigurationError as _e:
+            return Response(str(_e), status=400)
+        try:
+            cls.SUPERVISOR.add(name, Source(video_url, transforms=transforms))
+        except ConfigurationError as _e:
+            return Response(str(_e), status=409)
+        return Response("Accepted", status=202)
+
+    @staticmethod
+    def authorize() -> None:
+        """
+        Aborts the request unless it carries the `ADMIN_TOKEN` as bearer token.
+
+        Aborts with 404 if no `ADMIN_TOKEN` has been configured,
+        and with 401 if the token is missing or wrong.
+        """
+        if not ADMIN_TOKEN:
+            abort(404)
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not compare_digest(
+            token.encode(), ADMIN_TOKEN.encode()
+        ):
+            abort(401)
+
     @classmethod
     def flask(
         cls,
         name: str,
         live_route: str = "/live",
         health_route: str = "/health",
+        profile_route: str = "/admin/profile",
+        sources_route: str = "/admin/sources",
     ) -> Flask:
         """
         Returns a Flask application that is ready to serve the video stream.
@@ -124,9 +413,17 @@ class Server:
         Returns
         -------
         Flask
-            A Flask application with the '/live' and '/health' endpoints configured.
+            A Flask application with the '/live' and '/health' endpoints configured,
+            '/live/<name>' and '/health/<name>' for the supervised sources,
+            and the '/admin/profile' and '/admin/sources/<name>' endpoints.
         """
         app = Flask(name)
         app.add_url_rule(live_route, view_func=cls.live)
         app.add_url_rule(health_route, view_func=cls.health)
+        app.add_url_rule(f"{live_route}/<name>", view_func=cls.stream)
+        app.add_url_rule(f"{health_route}/<name>", view_func=cls.stream_health)
+        app.add_url_rule(profile_route, view_func=cls.profile)
+        app.add_url_rule(
+            f"{sources_route}/<name>", view_func=cls.source, methods=["PUT", "DELETE"]
+        )
         return app
@@ -0,0 +1,864 @@
+# -*- coding: utf-8 -*-
+
+"""Multi-process capture sharding"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import math
+import os
+import shutil
+import signal
+import struct
+from multiprocessing import get_context, parent_process
+from multiprocessing.connection import wait
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from queue import Empty
+from tempfile import mkdtemp
+from threading import Event, Lock, Thread
+from time import monotonic, sleep, time
+from typing import Any, ByteString, Callable, Iterable, Optional, Tuple, Union
+
+import cv2
+from numpy import generic, ndarray
+
+from mjpegazer.utils import (
+    ConfigurationError,
+    Errors,
+    Profiler,
+    ProfilingError,
+    get_logger,
+    typechecked,
+)
+from mjpegazer.utils.constants import (
+    CAPTURE_AFFINITY,
+    CAPTURE_WORKERS,
+    HEALTH_THRESHOLD,
+    SHARED_FRAME_SIZE,
+    SHARED_FRAME_TIMEOUT,
+    SUPERVISOR_INTERVAL,
+    VIDEO_SOURCES,
+)
+
+from .capture import Capture
+from .mjpeg import multipart
+from .transforms import Pipeline
+
+logger = get_logger(__name__)
+
+CONTEXT = get_context("spawn")  # don't fork a process that runs (flask) threads
+
+
+@typechecked
+class FrameSlot:
+    """The latest encoded frame of a source, in shared memory
+
+    A capture worker writes every encoded frame into the slot,
+    HTTP workers read it.
+    The header holds a sequence number which is odd while a frame is being written,
+    readers drop a frame when the sequence is odd or changed while copying it.
+
+    Parameters
+    ----------
+    name : Optional[str]
+        Name of an existing slot to attach to, a new one is created if `None`
+    size : int
+        Maximum size of an encoded frame, in bytes (only used when creating)
+    """
+
+    HEADER = struct.Struct("=QQdI")  # sequence, length, updated, failures
+
+    _memory: SharedMemory
+
+    def __init__(self, name: Optional[str] = None, size: int = SHARED_FRAME_SIZE):
+        if name is None:
+            self._memory = SharedMemory(create=True, size=self.HEADER.size + size)
+            self.HEADER.pack_into(self._memory.buf, 0, 0, 0, 0.0, 0)
+        else:
+            self._memory = SharedMemory(name=name)
+
+    @property
+    def name(self) -> str:
+        """Name of the shared memory block"""
+        return self._memory.name
+
+    @property
+    def header(self) -> Tuple[int, int, float, int]:
+        """Sequence, length, last update and consecutive failures"""
+        return self.HEADER.unpack_from(self._memory.buf, 0)
+
+    @property
+    def healthy(self) -> bool:
+        """Whether the slot has recently been updated without too many failures"""
+        _, _, updated, failures = self.header
+        return failures < HEALTH_THRESHOLD and time() - updated < SHARED_FRAME_TIMEOUT
+
+    def write(self, jpeg: Union[ndarray[int, generic], bytes]) -> bool:
+        """Write an encoded frame
+
+        Parameters
+        ----------
+        jpeg : Union[ndarray, bytes]
+            The encoded frame, as returned by `cv2.imencode`
+
+        Returns
+        -------
+        bool
+            False if the frame doesn't fit in the slot
+        """
+        data = memoryview(jpeg).cast("B")
+        length = data.nbytes
+        start = self.HEADER.size
+        if start + length > self._memory.size:
+            return False
+        buf = self._memory.buf
+        sequence = self.header[0] | 1  # odd: writing
+        self.HEADER.pack_into(buf, 0, sequence, 0, time(), 0)
+        buf[start : start + length] = data
+        self.HEADER.pack_into(buf, 0, sequence + 1, length, time(), 0)
+        return True
+
+    def fail(self) -> None:
+        """Report a failed capture"""
+        sequence, length, _, failures = self.header
+        if not sequence & 1:
+            self.HEADER.pack_into(
+                self._memory.buf, 0, sequence, length, time(), failures + 1
+            )
+
+    def read(self, after: int = 0) -> Optional[Tuple[int, bytes, float]]:
+        """Read the frame, if there is a new and consistent one
+
+        Parameters
+        ----------
+        after : int
+            Sequence number of the last frame that has been read
+
+        Returns
+        -------
+        Optional[Tuple[int, bytes, float]]
+            The sequence number, the encoded frame and when it was written
+        """
+        sequence, length, timestamp, _ = self.header
+        if sequence & 1 or sequence <= after or not length:
+            return None
+        start = self.HEADER.size
+        jpeg = bytes(self._memory.buf[start : start + length])
+        if self.header[0] != sequence:
+            return None
+        return sequence, jpeg, timestamp
+
+    def close(self) -> None:
+        """Detach from the shared memory"""
+        self._memory.close()
+
+    def unlink(self, close: bool = True) -> None:
+        """Destroy the shared memory, only the creator should do this
+
+        Parameters
+        ----------
+        close : bool
+            Detach as well, else it is detached once the slot is dropped
+            (by the last viewer that reads it)
+        """
+        if close:
+            self._memory.close()
+        self._memory.unlink()
+
+
+@typechecked
+class SharedFrames:
+    """MJPEG http multipart 'parts' read from a `FrameSlot`
+
+    The counterpart of `MJPEGFrames` for sources captured by a `Supervisor`,
+    every viewer reads the same encoded frames instead of capturing on its own.
+
+    Parameters
+    ----------
+    slot : FrameSlot
+        The slot the capture worker writes to
+    interval : float
+        Seconds to wait before polling again when there is no new frame
+    active : Optional[Callable[[], bool]]
+        Whether the source still exists, checked before every read,
+        the stream ends when it doesn't
+    """
+
+    def __init__(
+        self,
+        slot: FrameSlot,
+        interval: float = 0.005,
+        active: Optional[Callable[[], bool]] = None,
+    ):
+        self.slot = slot
+        self.interval = interval
+        self.active = active
+
+    def __iter__(self) -> Iterable[ByteString]:
+        """
+        Return an iterator for the SharedFrames object.
+
+        Returns
+        -------
+        Iterable[ByteString]
+            JPEG image bytes packaged as parts of an HTTP MJPEG multipart stream.
+        """
+        sequence = 0
+        while True:
+            Profiler.checkpoint()
+            try:
+                if self.active is not None and not self.active():
+                    break  # the source has been removed
+                frame = self.slot.read(sequence)
+                if frame is None:
+                    sleep(self.interval)
+                    continue
+                sequence, jpeg, timestamp = frame
+                yield multipart(jpeg, timestamp)
+            except GeneratorExit:
+                break  # graceful exit
+
+    @property
+    def healthy(self) -> bool:
+        """
+        Check if the captured source is healthy.
+
+        Returns
+        -------
+        bool
+            True if the source is healthy, False otherwise.
+        """
+        return self.slot.healthy
+
+
+@typechecked
+class Source:
+    """A video source managed by a `Supervisor`
+
+    The resolution and frame rate are used to weigh the work of
+    capturing the source, they don't change the capture itself.
+    They are replaced by the probed values once the source has been opened.
+
+    Parameters
+    ----------
+    video_url : str
+        The URL of the video source
+    width : int
+        Expected frame width
+    height : int
+        Expected frame height
+    fps : float
+        Expected frame rate
+    transforms : str
+        Transforms applied to every frame, see `Pipeline.parse`
+    """
+
+    def __init__(
+        self,
+        video_url: str,
+        width: int = 1280,
+        height: int = 720,
+        fps: float = 25.0,
+        transforms: str = "",
+    ):
+        self.video_url = video_url
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.transforms = transforms
+
+    @property
+    def weight(self) -> float:
+        """Pixels per second"""
+        return self.width * self.height * self.fps
+
+
+def _probe(cap: cv2.VideoCapture) -> Optional[Tuple[int, int, float]]:
+    """Frame width, height and rate of an opened capture, if known"""
+    # pylint: disable=no-member
+    width = cap.get(cv2.CAP_PROP_FRAME_WIDTH)
+    height = cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if not all(math.isfinite(i) and i > 0 for i in (width, height, fps)):
+        return None
+    return int(width), int(height), round(fps, 2)
+
+
+def _capture(
+    name: str,
+    video_url: str,
+    transforms: str,
+    slot_name: str,
+    events: Any,
+    stop: Event,
+) -> None:
+    """Capture, transform and encode a source into its slot until stopped
+
+    The probed resolution and frame rate are reported on `events`.
+    """
+    # pylint: disable=too-many-arguments
+    slot = FrameSlot(slot_name)
+    pipeline = Pipeline.parse(transforms)
+    frame: Optional[ndarray[int, generic]] = None
+    probed = None
+    # pylint: disable=no-member
+    try:
+        while not stop.is_set():
+            try:
+                with Capture(video_url) as cap:
+                    if cap.isOpened() and probed is None:
+                        probed = _probe(cap)
+                        if probed is not None:
+                            events.put(("probed", name, *probed))
+                    while not stop.is_set() and cap.isOpened():
+                        Profiler.checkpoint()
+                        ret, frame = cap.read(image=frame)
+                        if not ret:
+                            slot.fail()
+                            break  # reconnect
+                        ret, jpeg = cv2.imencode(".jpg", pipeline(frame))
+                        if not ret or not slot.write(jpeg):
+                            logger.warning(
+                                "%s: frame not encoded or too large", video_url
+                            )
+                            slot.fail()
+            except Errors as _e:
+                logger.warning("%s: %s", video_url, _e)
+                slot.fail()
+            except Exception:  # pylint: disable=broad-exception-caught
+                # keep the thread alive, it reconnects
+                logger.exception("%s: capture failed", video_url)
+                slot.fail()
+            stop.wait(1.0)  # before reconnecting
+    finally:
+        slot.close()
+
+
+def _profile(
+    name: str, directory: str, mode: str, duration: float, interval: float
+) -> None:
+    """Profile a capture worker and write the profile to `<directory>/<name>.profile`"""
+    try:
+        if mode == "sample":
+            data = Profiler.sample(duration, interval).encode()
+        else:
+            data = Profiler.deterministic(duration)
+    except ProfilingError as _e:
+        logger.warning("%s: %s", name, _e)
+        return
+    path = Path(directory) / name
+    path.with_suffix(".tmp").write_bytes(data)
+    os.replace(path.with_suffix(".tmp"), path.with_suffix(".profile"))
+
+
+def _stopped(name: str, thread: Optional[Thread], events: Any) -> None:
+    """Tell the supervisor once a capture thread has stopped"""
+    if thread is not None:
+        thread.join()
+    events.put(("stopped", name))
+
+
+def _worker(index: int, commands: Any, events: Any, cpus: Optional[list[int]]) -> None:
+    """Capture worker process, runs a thread per source assigned to it
+
+    A stopped source is acknowledged on `events` once its thread has exited,
+    so it is never captured by two workers at the same time.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the supervisor stops the workers
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    threads: dict[str, Tuple[Thread, Event]] = {}
+    parent = parent_process()
+    while parent is None or parent.is_alive():
+        try:
+            command, name, *args = commands.get(timeout=SUPERVISOR_INTERVAL)
+        except Empty:
+            continue
+        if command in ("stop", "exit") and name in threads:
+            threads[name][1].set()
+        if command == "stop":
+            thread, _ = threads.pop(name, (None, None))
+            Thread(target=_stopped, args=(name, thread, events), daemon=True).start()
+        if command == "start" and name not in threads:
+            stop = Event()
+            thread = Thread(
+                target=_capture,
+                args=(name, *args, events, stop),
+                name=name,
+                daemon=True,
+            )
+            thread.start()
+            threads[name] = (thread, stop)
+        if command == "profile":
+            Thread(
+                target=_profile, args=(f"capture-{index}", name, *args), daemon=True
+            ).start()
+        if command == "exit":
+            break
+    logger.debug("capture worker %s exiting", index)
+    for thread, stop in threads.values():
+        stop.set()
+    for thread, stop in threads.values():
+        thread.join(SUPERVISOR_INTERVAL)
+
+
+@typechecked
+class Supervisor:
+    """Spreads video sources across a pool of capture worker processes
+
+    Each worker process captures, transforms and encodes its sources,
+    it writes the encoded frames to shared memory (a `FrameSlot` per source)
+    from which every HTTP worker can serve them.
+    This way decoding and encoding isn't limited to a single core (and GIL).
+
+    Sources are weighed by resolution and frame rate,
+    as probed by the worker once a source has been opened,
+    a new source goes to the least loaded worker,
+    after which sources are moved between workers until the load is balanced.
+    A moved source is started by its new worker once the previous one stopped it.
+    Crashed workers are restarted with the sources that were assigned to them.
+
+    Create and start the supervisor before the HTTP workers are forked,
+    (i.e. gunicorn with `preload_app`) so they share the slots.
+    The supervisor publishes the slot of every source in a registry in shared memory,
+    so the HTTP workers also find sources that are added later.
+    Sources can be added and removed in a forked HTTP worker as well,
+    the change is forwarded to the supervisor and applied asynchronously.
+
+    Parameters
+    ----------
+    processes : int
+        Number of capture worker processes, `0` for one per CPU core
+    affinity : bool
+        Pin every worker process to a CPU core (Linux only)
+    frame_size : int
+        Maximum size of an encoded frame, in bytes
+
+    Usage
+    -----
+    >>> supervisor = Supervisor(4)
+    >>> supervisor.add("front", Source("rtsp://...", 1920, 1080, 30))
+    >>> supervisor.start()
+    >>> Server.supervise(supervisor)
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    REGISTRY_SIZE: int = 64 * 1024  # bytes of JSON, name and slot of every source
+
+    def __init__(
+        self,
+        processes: int = CAPTURE_WORKERS,
+        affinity: bool = CAPTURE_AFFINITY,
+        frame_size: int = SHARED_FRAME_SIZE,
+    ):
+        self.processes = processes or os.cpu_count() or 1
+        self.affinity = affinity
+        self.frame_size = frame_size
+        self.sources: dict[str, Source] = {}
+        self.slots: dict[str, FrameSlot] = {}
+        self.assignment: dict[str, int] = {}
+        self._workers: list[Any] = [None] * self.processes
+        self._commands: list[Any] = [None] * self.processes
+        self._events = CONTEXT.Queue()  # from the workers
+        # sources being stopped, by their previous worker
+        self._moving: dict[str, int] = {}
+        self._lock = Lock()
+        self._stopping = Event()
+        self._monitor: Optional[Thread] = None
+        self._listener: Optional[Thread] = None
+        self._pid = os.getpid()
+        self._registry = FrameSlot(size=self.REGISTRY_SIZE)
+        self._published = 0  # sequence of the registry that `slots` reflects
+        self._publish()
+
+    @classmethod
+    def from_environment(cls) -> Supervisor:
+        """Create a supervisor with the sources in `VIDEO_SOURCES`
+
+        `VIDEO_SOURCES` is a whitespace separated list of `name=url` pairs
+
+        Returns
+        -------
+        Supervisor
+            The (not yet started) supervisor
+
+        Raises
+        ------
+        ConfigurationError
+            If an entry isn't a `name=url` pair
+        """
+        supervisor = cls()
+        for item in VIDEO_SOURCES.split():
+            name, _, video_url = item.partition("=")
+            if not name or not video_url:
+                raise ConfigurationError(f"Invalid video source: {item}")
+            supervisor.add(name, Source(video_url))
+        return supervisor
+
+    @property
+    def loads(self) -> list[float]:
+        """Summed weight of the sources per worker"""
+        loads = [0.0] * self.processes
+        for name, index in self.assignment.items():
+            loads[index] += self.sources[name].weight
+        return loads
+
+    @property
+    def running(self) -> bool:
+        """Whether the supervisor has been started (and not stopped)"""
+        return self._monitor is not None and not self._stopping.is_set()
+
+    @property
+    def forked(self) -> bool:
+        """Whether this is a forked (HTTP worker) process, not the supervisor's own"""
+        return os.getpid() != self._pid
+
+    def add(self, name: str, source: Source) -> None:
+        """Add a source and rebalance
+
+        In a forked process the source is added by the supervisor, asynchronously.
+
+        Parameters
+        ----------
+        name : str
+            Unique name of the source
+        source : Source
+            The source
+
+        Raises
+        ------
+        ConfigurationError
+            If a source with the same name already exists (not when forked)
+        """
+        if self.forked:
+            self._events.put(("add", name, source))
+            return
+        with self._lock:
+            self._add(name, source)
+
+    def remove(self, name: str) -> None:
+        """Remove a source and rebalance
+
+        In a forked process the source is removed by the supervisor, asynchronously.
+
+        Parameters
+        ----------
+        name : str
+            Name of the source
+        """
+        if self.forked:
+            self._events.put(("remove", name))
+            return
+        with self._lock:
+            self._remove(name)
+
+    def slot(self, name: str) -> Optional[FrameSlot]:
+        """The slot of a source
+
+        In a forked process the registry is checked for added and removed sources first.
+
+        Parameters
+        ----------
+        name : str
+            Name of the source
+
+        Returns
+        -------
+        Optional[FrameSlot]
+            The slot, None if there is no such source
+        """
+        if self.forked:
+            self._refresh()
+        return self.slots.get(name, None)
+
+    def profile(self, mode: str, duration: float, interval: float) -> str:
+        """Start profiling every capture worker, see `Profiler`
+
+        Parameters
+        ----------
+        mode : str
+            `sample` or `deterministic`
+        duration : float
+            Seconds to profile for
+        interval : float
+            Seconds between samples
+
+        Returns
+        -------
+        str
+            The directory the profiles are written to, pass it on to `profiles`
+        """
+        directory = mkdtemp(prefix="mjpegazer-profile-")
+        if self.forked:
+            self._events.put(("profile", directory, mode, duration, interval))
+        else:
+            with self._lock:
+                self._profile(directory, mode, duration, interval)
+        return directory
+
+    def profiles(self, directory: str, timeout: float) -> dict[str, bytes]:
+        """Wait for the profiles of the capture workers, and remove them
+
+        Parameters
+        ----------
+        directory : str
+            As returned by `profile`
+        timeout : float
+            Seconds to wait for all workers, the profiles so far are returned after
+
+        Returns
+        -------
+        dict[str, bytes]
+            The profile per worker name, i.e. `capture-0`
+        """
+        path = Path(directory)
+        end = monotonic() + timeout
+        try:
+            while (
+                len(list(path.glob("*.profile"))) < self.processes and monotonic() < end
+            ):
+                sleep(0.05)
+            return {i.stem: i.read_bytes() for i in sorted(path.glob("*.profile"))}
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def frames(self, name: str) -> SharedFrames:
+        """MJPEG frames of a source, to be served to a viewer
+
+        Parameters
+        ----------
+        name : str
+            Name of the source
+
+        Returns
+        -------
+        SharedFrames
+            Iterable of MJPEG http multipart 'parts', until the source is removed
+        """
+        slot = self.slots[name]
+        return SharedFrames(slot, active=lambda: self.slot(name) is slot)
+
+    def start(self) -> None:
+        """Start the worker processes and the monitor thread"""
+        with self._lock:
+            if self._monitor is not None:
+                return
+            for index in range(self.processes):
+                self._spawn(index)
+            self._monitor = Thread(
+                target=self._supervise, name="supervisor", daemon=True
+            )
+            self._monitor.start()
+            self._listener = Thread(
+                target=self._listen, name="supervisor-events", daemon=True
+            )
+            self._listener.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """Stop the worker processes and destroy the slots"""
+        if os.getpid() != self._pid or self._stopping.is_set():
+            return  # i.e. a forked HTTP worker exiting
+        self._stopping.set()
+        with self._lock:
+            for index, process in enumerate(self._workers):
+                if process is None:
+                    continue
+                self._send(index, "exit", "")
+                process.join(SUPERVISOR_INTERVAL * 2)
+                if process.is_alive():
+                    process.terminate()
+            for slot in self.slots.values():
+                slot.unlink()
+            self.slots.clear()
+            self._registry.unlink()
+
+    def _add(self, name: str, source: Source) -> None:
+        """Add a source, rebalance and publish its slot"""
+        if name in self.sources:
+            raise ConfigurationError(f"Video source already exists: {name}")
+        self.sources[name] = source
+        self.slots[name] = FrameSlot(size=self.frame_size)
+        loads = self.loads
+        self._assign(name, loads.index(min(loads)))
+        self._balance()
+        self._publish()
+
+    def _remove(self, name: str) -> None:
+        """Remove a source, rebalance and unpublish its slot"""
+        index = self.assignment.pop(name)
+        if self._moving.pop(name, None) is None:  # else it is being stopped already
+            self._send(index, "stop", name)
+        del self.sources[name]
+        # viewers in this process may still read it
+        self.slots.pop(name).unlink(close=False)
+        self._balance()
+        self._publish()
+
+    def _publish(self) -> None:
+        """Write the name and slot of every source to the registry"""
+        registry = json.dumps({name: slot.name for name, slot in self.slots.items()})
+        if not self._registry.write(registry.encode()):
+            raise ConfigurationError(f"Too many video sources: {len(self.slots)}")
+        self._published = self._registry.header[0]
+
+    def _refresh(self) -> None:
+        """Attach to the slots of sources added to the registry since the last read"""
+        registry = self._registry.read(self._published)
+        if registry is None:
+            return
+        sequence, data, _ = registry
+        attached = {slot.name: slot for slot in self.slots.values()}
+        slots: dict[str, FrameSlot] = {}
+        for name, slot_name in json.loads(data).items():
+            try:
+                slots[name] = attached.get(slot_name, None) or FrameSlot(slot_name)
+            except FileNotFoundError:
+                continue  # removed in the meantime
+        self.slots = slots
+        self._published = sequence
+
+    def _assign(self, name: str, index: int) -> None:
+        """(Re)assign a source to a worker
+
+        A source that is running elsewhere is stopped first,
+        it is started by `_stopped` when the previous worker acknowledges that.
+        """
+        previous = self.assignment.get(name, None)
+        if previous == index:
+            return
+        self.assignment[name] = index
+        if name in self._moving:
+            return  # still being stopped, started at its latest assignment
+        if previous is not None and self._commands[previous] is not None:
+            self._moving[name] = previous
+            self._send(previous, "stop", name)
+        else:
+            self._start(name)
+
+    def _start(self, name: str) -> None:
+        """Tell the assigned worker to start capturing a source"""
+        source = self.sources[name]
+        self._send(
+            self.assignment[name],
+            "start",
+            name,
+            source.video_url,
+            source.transforms,
+            self.slots[name].name,
+        )
+
+    def _balance(self) -> None:
+        """Move sources from the most to the least loaded worker while it helps
+
+        Every move lowers the spread of the load,
+        only as few sources as needed are moved (and reconnected).
+        """
+        loads = self.loads
+        while True:
+            high = loads.index(max(loads))
+            low = loads.index(min(loads))
+            gap = loads[high] - loads[low]
+            movable = [
+                name
+                for name, index in self.assignment.items()
+                if index == high and 0 < self.sources[name].weight < gap
+            ]
+            if not movable:
+                return
+            name = max(movable, key=lambda i: self.sources[i].weight)
+            loads[high] -= self.sources[name].weight
+            loads[low] += self.sources[name].weight
+            self._assign(name, low)
+
+    def _probed(self, name: str, width: int, height: int, fps: float) -> None:
+        """A worker probed a source, reweigh it and rebalance if it changed"""
+        source = self.sources.get(name, None)
+        probed = (width, height, fps)
+        if source is None or (source.width, source.height, source.fps) == probed:
+            return
+        logger.info("%s: probed %sx%s at %s fps", name, width, height, fps)
+        source.width, source.height, source.fps = width, height, fps
+        self._balance()
+
+    def _stopped(self, name: str) -> None:
+        """A worker stopped capturing a source, start it at its new assignment"""
+        if self._moving.pop(name, None) is not None and name in self.sources:
+            self._start(name)
+
+    def _profile(
+        self, directory: str, mode: str, duration: float, interval: float
+    ) -> None:
+        """Tell every worker to profile itself"""
+        for index in range(self.processes):
+            self._send(index, "profile", directory, mode, duration, interval)
+
+    def _send(self, index: int, *command: Any) -> None:
+        """Send a command to a worker, if it is running"""
+        if self._commands[index] is not None:
+            self._commands[index].put(command)
+
+    def _spawn(self, index: int) -> None:
+        """Start (or restart) a worker with the sources assigned to it"""
+        cpus = None
+        if self.affinity and hasattr(os, "sched_getaffinity"):
+            available = sorted(os.sched_getaffinity(0))
+            cpus = [available[index % len(available)]]
+        self._commands[index] = CONTEXT.Queue()
+        self._workers[index] = CONTEXT.Process(
+            target=_worker,
+            args=(index, self._commands[index], self._events, cpus),
+            name=f"capture-{index}",
+            daemon=True,
+        )
+        self._workers[index].start()
+        died = [name for name, previous in self._moving.items() if previous == index]
+        for name in died:  # stopped along with the worker
+            del self._moving[name]
+        for name, assigned in self.assignment.items():
+            if (assigned == index and name not in self._moving) or name in died:
+                self._start(name)
+
+    def _supervise(self) -> None:
+        """Restart worker processes that died
+
+        The process sentinels are used, as the exit status may be reaped by
+        someone else (i.e. the gunicorn arbiter reaps all its children)
+        """
+        while not self._stopping.is_set():
+            sentinels = {i.sentinel: n for n, i in enumerate(self._workers)}
+            for sentinel in wait(list(sentinels), SUPERVISOR_INTERVAL):
+                with self._lock:
+                    if self._stopping.is_set():
+                        return
+                    index = sentinels[sentinel]
+                    logger.warning(
+                        "capture worker %s died (%s), restarting",
+                        index,
+                        self._workers[index].exitcode,
+                    )
+                    self._spawn(index)
+
+    def _listen(self) -> None:
+        """Handle the events of the workers and the changes forwarded by forks"""
+        while not self._stopping.is_set():
+            try:
+                event, name, *args = self._events.get(timeout=SUPERVISOR_INTERVAL)
+            except Empty:
+                continue
+            with self._lock:
+                if event == "stopped":
+                    self._stopped(name)
+                elif event == "probed":
+                    self._probed(name, *args)
+                elif event == "add":
+                    try:
+                        self._add(name, *args)
+                    except ConfigurationError as _e:
+                        logger.warning("%s", _e)
+                elif event == "remove" and name in self.sources:
+                    self._remove(name)
+                elif event == "profile":
+                    self._profile(name, *args)
@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+
+"""Frame transforms"""
+
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from copy import copy
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+
+import cv2
+from numpy import dtype as DType
+from numpy import empty, generic, ndarray
+
+from mjpegazer.utils import ConfigurationError, get_logger, typechecked
+from mjpegazer.utils.constants import MIRROR_IMAGE, TRANSFORMS
+
+logger = get_logger(__name__)
+
+
+@typechecked
+class Transform(ABC):
+    """Base class of a single frame transform
+
+    A transform takes a frame and returns the transformed frame.
+    Transforms that produce a new image write it into a buffer that is
+    owned by the transform and reused for every following frame,
+    it is only (re)allocated when the shape or dtype of the output changes.
+
+    As such, the returned frame is only valid until the next call,
+    and a transform instance should not be shared between streams,
+    every stream should use its own `copy`.
+
+    Usage
+    -----
+    >>> flip = Flip(1)
+    >>> frame = flip(frame)
+    """
+
+    _dst: Optional[ndarray[int, generic]] = None
+
+    @abstractmethod
+    def __call__(self, frame: ndarray[int, generic]) -> ndarray[int, generic]:
+        """Transform a frame
+
+        Parameters
+        ----------
+        frame : ndarray
+            The frame to transform
+
+        Returns
+        -------
+        ndarray
+            The transformed frame
+        """
+
+    def copy(self) -> Transform:
+        """A copy of the transform with its own (not yet allocated) buffer
+
+        Returns
+        -------
+        Transform
+            The copy
+        """
+        transform = copy(self)
+        transform._dst = None
+        return transform
+
+    def _buffer(self, shape: Tuple[int, ...], dtype: DType) -> ndarray[int, generic]:
+        """Get the output buffer, (re)allocate it if the shape or dtype changed
+
+        Parameters
+        ----------
+        shape : Tuple[int, ...]
+            Shape of the output frame
+        dtype : numpy.dtype
+            Data type of the output frame
+
+        Returns
+        -------
+        ndarray
+            The reusable output buffer
+        """
+        if self._dst is None or self._dst.shape != shape or self._dst.dtype != dtype:
+            logger.debug(
+                "%s: allocating %s %s buffer", type(self).__name__, shape, dtype
+            )
+            self._dst = empty(shape, dtype)
+        return self._dst
+
+
+@typechecked
+class Flip(Transform):
+    """Flip (mirror) a frame
+
+    Parameters
+    ----------
+    code : int
+        `1` flips horizontally, `0` vertically and `-1` both (as `cv2.flip`)
+    """
+
+    def __init__(self, code: int = 1):
+        if code not in (-1, 0, 1):
+            raise ConfigurationError(f"Invalid flip code: {code}")
+        self.code = code
+
+    def __call__(self, frame: ndarray[int, generic]) -> ndarray[int, generic]:
+        dst = self._buffer(frame.shape, frame.dtype)
+        return cv2.flip(frame, self.code, dst=dst)
+
+
+@typechecked
+class Rotate(Transform):
+    """Rotate a frame clockwise by a multiple of 90 degrees
+
+    Parameters
+    ----------
+    degrees : int
+        One of `90`, `180` or `270`
+    """
+
+    ROTATIONS: dict[int, int] = {
+        90: cv2.ROTATE_90_CLOCKWISE,
+        180: cv2.ROTATE_180,
+        270: cv2.ROTATE_90_COUNTERCLOCKWISE,
+    }
+
+    def __init__(self, degrees: int = 90):
+        if degrees not in self.ROTATIONS:
+            raise ConfigurationError(f"Invalid rotation: {degrees}")
+        self.degrees = degrees
+
+    def __call__(self, frame: ndarray[int, generic]) -> ndarray[int, generic]:
+        shape = frame.shape
+        if self.degrees != 180:
+            shape = (shape[1], shape[0], *shape[2:])
+        dst = self._buffer(shape, frame.dtype)
+        return cv2.rotate(frame, self.ROTATIONS[self.degrees], dst=dst)
+
+
+@typechecked
+class Crop(Transform):
+    """Crop a frame to a region of interest
+
+    The cropped frame is a view on the input frame, nothing is copied.
+    The region must lie within the frame.
+
+    Parameters
+    ----------
+    x : int
+        Left edge of the region
+    y : int
+        Top edge of the region
+    width : int
+        Width of the region
+    height : int
+        Height of the region
+    """
+
+    def __init__(self, x: int, y: int, width: int, height: int):
+        if min(x, y) < 0 or min(width, height) <= 0:
+            raise ConfigurationError(f"Invalid crop: {x}, {y}, {width}, {height}")
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+    def __call__(self, frame: ndarray[int, generic]) -> ndarray[int, generic]:
+        if (
+            self.x + self.width > frame.shape[1]
+            or self.y + self.height > frame.shape[0]
+        ):
+            raise ConfigurationError(
+                f"Crop {self.x}, {self.y}, {self.width}, {self.height} "
+                + f"outside of a {frame.shape[1]}x{frame.shape[0]} frame"
+            )
+        return frame[self.y : self.y + self.height, self.x : self.x + self.width]
+
+
+@typechecked
+class Resize(Transform):
+    """Resize a frame
+
+    Parameters
+    ----------
+    width : int
+        Width of the output frame
+    height : int
+        Height of the output frame
+    interpolation : int
+        `cv2` interpolation flag, default `cv2.INTER_AREA`
+    """
+
+    def __init__(self, width: int, height: int, interpolation: int = cv2.INTER_AREA):
+        if min(width, height) <= 0:
+            raise ConfigurationError(f"Invalid size: {width}, {height}")
+        self.width = width
+        self.height = height
+        self.interpolation = interpolation
+
+    def __call__(self, frame: ndarray[int, generic]) -> ndarray[int, generic]:
+        dst = self._buffer((self.height, self.width, *frame.shape[2:]), frame.dtype)
+        return cv2.resize(
+            frame,
+            (self.width, self.height),
+            dst=dst,
+            interpolation=self.interpolation,
+        )
+
+
+@typechecked
+class Grayscale(Transform):
+    """Convert a BGR frame to grayscale, frames that already are pass through"""
+
+    def __call__(self, frame: ndarray[int, generic]) -> ndarray[int, generic]:
+        if frame.ndim == 2:
+            return frame
+        dst = self._buffer(frame.shape[:2], frame.dtype)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=dst)
+
+
+@typechecked
+class Timestamp(Transform):
+    """Draw the current (local) time on a frame
+
+    The text is drawn in place, on the frame that is passed in.
+
+    Parameters
+    ----------
+    fmt : str
+        `strftime` format of the timestamp
+    origin : Tuple[int, int]
+        Bottom left corner of the text
+    scale : float
+        Font scale
+    color : Tuple[int, int, int]
+        BGR color of the text
+    """
+
+    def __init__(
+        self,
+        fmt: str = "%Y-%m-%d %H:%M:%S",
+        origin: Tuple[int, int] = (10, 30),
+        scale: float = 1.0,
+        color: Tuple[int, int, int] = (255, 255, 255),
+    ):
+        self.fmt = fmt
+        self.origin = origin
+        self.scale = scale
+        self.color = color
+
+    def __call__(self, frame: ndarray[int, generic]) -> ndarray[int, generic]:
+        cv2.putText(
+            frame,
+            datetime.now().strftime(self.fmt),
+            self.origin,
+            cv2.FONT_HERSHEY_SIMPLEX,
+            self.scale,
+            self.color,
+            2,
+            cv2.LINE_AA,
+        )
+        return frame
+
+
+@typechecked
+class Pipeline(Transform):
+    """A chain of transforms, applied in order
+
+    Each stream should get its own pipeline (`copy`),
+    as the transforms in it own the (reused) frame buffers.
+    `MJPEGFrames` copies its pipeline for every viewer.
+
+    Parameters
+    ----------
+    transforms : Iterable[Transform]
+        The transforms to apply
+
+    Usage
+    -----
+    >>> pipeline = Pipeline([Crop(0, 0, 640, 480), Flip(1), Timestamp()])
+    >>> MJPEGFrames(Capture("my video url"), pipeline)
+
+    >>> pipeline = Pipeline.parse("crop=0,0,640,480;flip=1;timestamp")
+    """
+
+    PARSERS: dict[str, type] = {
+        "flip": Flip,
+        "rotate": Rotate,
+        "crop": Crop,
+        "resize": Resize,
+        "grayscale": Grayscale,
+        "timestamp": Timestamp,
+    }
+    WITHOUT_ARGUMENTS: Tuple[str, ...] = ("grayscale", "timestamp")
+
+    transforms: list[Transform]
+
+    def __init__(self, transforms: Iterable[Transform] = ()):
+        self.transforms = list(transforms)
+
+    def __call__(self, frame: ndarray[int, generic]) -> ndarray[int, generic]:
+        for transform in self.transforms:
+            frame = transform(frame)
+        return frame
+
+    def __bool__(self) -> bool:
+        return bool(self.transforms)
+
+    def copy(self) -> Pipeline:
+        """A copy of the pipeline for another stream, with copies of its transforms
+
+        Returns
+        -------
+        Pipeline
+            The copy
+        """
+        return type(self)(i.copy() for i in self.transforms)
+
+    @classmethod
+    def parse(cls, spec: str) -> Pipeline:
+        """Create a pipeline from a string specification
+
+        Transforms are separated by `;`, their (integer) arguments
+        follow a `=` and are separated by `,`,
+        i.e. `"rotate=90;resize=640,480;grayscale"`,
+        `grayscale` and `timestamp` take no arguments.
+
+        Parameters
+        ----------
+        spec : str
+            The pipeline specification
+
+        Returns
+        -------
+        Pipeline
+            The pipeline
+
+        Raises
+        ------
+        ConfigurationError
+            If the specification is invalid
+        """
+        transforms: list[Transform] = []
+        for item in filter(None, (i.strip() for i in spec.split(";"))):
+            name, _, arguments = item.partition("=")
+            name = name.strip().lower()
+            transform = cls.PARSERS.get(name, None)
+            if transform is None:
+                raise ConfigurationError(f"Unknown transform: {name}")
+            if name in cls.WITHOUT_ARGUMENTS and arguments.strip():
+                raise ConfigurationError(f"Invalid transform, no arguments: {item}")
+            try:
+                args = [int(i) for i in arguments.split(",") if i.strip()]
+                transforms.append(transform(*args))
+            except (TypeError, ValueError) as _e:
+                raise ConfigurationError(f"Invalid transform: {item}") from _e
+        return cls(transforms)
+
+    @classmethod
+    def default(cls) -> Pipeline:
+        """Create the pipeline configured by the environment
+
+        `MIRROR_IMAGE` adds a horizontal flip in front of `TRANSFORMS`
+
+        Returns
+        -------
+        Pipeline
+            The pipeline
+        """
+        pipeline = cls.parse(TRANSFORMS)
+        if MIRROR_IMAGE:
+            pipeline.transforms.insert(0, Flip(1))
+        return pipeline
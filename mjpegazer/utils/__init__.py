@@ -4,7 +4,17 @@
 
 from . import constants
 from .loggers import get_logger
-from .exceptions import Errors, InitializationError
+from .exceptions import ConfigurationError, Errors, InitializationError
 from .development import typechecked
+from .profiling import Profiler, ProfilingError
 
-__all__ = ["constants", "get_logger", "Errors", "InitializationError", "typechecked"]
+__all__ = [
+    "constants",
+    "get_logger",
+    "Errors",
+    "InitializationError",
+    "ConfigurationError",
+    "typechecked",
+    "Profiler",
+    "ProfilingError",
+]
@@ -5,6 +5,7 @@
 from __future__ import annotations
 
 from os import getenv
+from pathlib import Path
 from typing import Any, Optional, Union
 
 TRUE_STRINGS: list[str] = [
@@ -22,6 +23,8 @@ HEALTH_THRESHOLD: int = 42  # Q: Why is this 42?
 # A: https://en.wikipedia.org/wiki/Phrases_from_The_Hitchhiker%27s_Guide_to_the_Galaxy
 # A: In reality, it should probably be less
 # A: it is the number of consecutive fails before the MJPEG object is considered 'unhealthy'
+# A: and the number of consecutive fails after which a stream ends
+FAILURE_BACKOFF: float = 0.05  # seconds between failed reads
 
 LOG_FORMAT: str = (
     "[%(asctime)s - %(levelname)s] %(name)s: "
@@ -29,9 +32,32 @@ LOG_FORMAT: str = (
 )
 LOG_FILE: Optional[str] = getenv("LOG_FILE", None)
 MIRROR_IMAGE: bool = getenv("MIRROR_IMAGE", "False").upper() in TRUE_STRINGS
+TRANSFORMS: str = getenv("TRANSFORMS", "")  # i.e. "rotate=90;resize=640,480;timestamp"
 
 
 DEBUG: bool = getenv("DEBUG", "False").upper() in TRUE_STRINGS
 FLASK_RUN_HOST: str = getenv("FLASK_RUN_HOST", "127.0.0.1")
 FLASK_RUN_PORT: int = int(getenv("FLASK_RUN_PORT", "5000"))
 VIDEO_URL: str = getenv("VIDEO_URL", "webcam://0")
+VIDEO_SOURCES: str = getenv("VIDEO_SOURCES", "")  # name=url, i.e. "back=webcam://0"
+RELAY_TIMEOUT: float = float(getenv("RELAY_TIMEOUT", "10"))  # seconds without a frame
+RELAY_RECONNECT: float = float(getenv("RELAY_RECONNECT", "1"))  # seconds between tries
+CACHE_DIR: str = getenv(
+    "CACHE_DIR", str(Path(getenv("XDG_CACHE_HOME", "~/.cache")) / "mjpegazer")
+)
+
+CAPTURE_WORKERS: int = int(getenv("CAPTURE_WORKERS", "0"))  # 0: one per CPU core
+CAPTURE_AFFINITY: bool = getenv("CAPTURE_AFFINITY", "False").upper() in TRUE_STRINGS
+SHARED_FRAME_SIZE: int = int(getenv("SHARED_FRAME_SIZE", str(4 * 1024 * 1024)))  # bytes
+SHARED_FRAME_TIMEOUT: float = float(getenv("SHARED_FRAME_TIMEOUT", "5"))  # seconds
+SUPERVISOR_INTERVAL: float = 1.0  # seconds between checks on the capture workers
+
+MAX_VIEWERS: int = int(getenv("MAX_VIEWERS", "0"))  # in total, 0: unlimited
+MAX_STREAM_VIEWERS: int = int(getenv("MAX_STREAM_VIEWERS", "0"))  # 0: unlimited
+VIEWER_CLASSES: str = getenv("VIEWER_CLASSES", "public=0")  # class=priority
+VIEWER_TOKENS: str = getenv("VIEWER_TOKENS", "")  # i.e. "operator=<secret>"
+DEFAULT_VIEWER_CLASS: str = getenv("DEFAULT_VIEWER_CLASS", "public")
+RETRY_AFTER: int = int(getenv("RETRY_AFTER", "5"))  # seconds, when a viewer is refused
+
+ADMIN_TOKEN: str = getenv("ADMIN_TOKEN", "")  # admin endpoints are off without it
+PROFILE_MAX_DURATION: float = float(getenv("PROFILE_MAX_DURATION", "60"))  # seconds
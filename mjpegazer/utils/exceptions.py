@@ -9,3 +9,7 @@ class Errors(BaseException):
 
 class InitializationError(Errors):
     """Initialization Error"""
+
+
+class ConfigurationError(Errors):
+    """Configuration Error"""
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+
+"""Profiling Utilities"""
+
+from __future__ import annotations
+
+import cProfile
+import marshal
+import sys
+import threading
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pstats import Stats
+from threading import (
+    Lock,
+    Thread,
+    current_thread,
+    enumerate as threads,
+    get_ident,
+    local,
+)
+from time import monotonic, perf_counter, sleep
+from typing import Any, Mapping, Optional, Tuple
+
+from .exceptions import Errors
+from .loggers import get_logger
+
+logger = get_logger(__name__)
+
+
+class ProfilingError(Errors):
+    """Profiling is not possible (right now)"""
+
+
+class _Threads:
+    """cProfile profilers per thread, for Python < 3.12
+
+    A profiler is enabled in threads that start during the session
+    (`threading.setprofile`) and in threads that pass `Profiler.checkpoint`.
+    It can only be disabled in its own thread, at a checkpoint,
+    or read once its thread has exited.
+    Threads that start during the session don't necessarily pass a checkpoint,
+    their profiler disables itself on its first event after the session.
+    """
+
+    def __init__(self) -> None:
+        self.active = True
+        # by id of the profiler
+        self.running: dict[int, Tuple[Thread, cProfile.Profile]] = {}
+        self.stopped: list[cProfile.Profile] = []
+        self._lock = Lock()
+
+    def __call__(self, *_: Any) -> None:
+        """Profile function of new threads, replaces itself by a profiler"""
+        sys.setprofile(None)
+        self.enable(stops=True)
+
+    def enable(self, stops: bool = False) -> None:
+        """Profile the calling thread
+
+        A profiler that `stops` checks the session on every event,
+        through its timer, and disables itself once the session ended.
+        """
+        profile: cProfile.Profile
+
+        def timer() -> float:
+            if not self.active:
+                sys.setprofile(None)  # the profiler of this thread
+                self._stopped(profile)
+            return perf_counter()
+
+        profile = cProfile.Profile(timer) if stops else cProfile.Profile()
+        with self._lock:
+            if not self.active:
+                return
+            # thread idents are reused
+            self.running[id(profile)] = (current_thread(), profile)
+        _LOCAL.profile = (self, profile)
+        profile.enable()
+
+    def disable(self, profile: cProfile.Profile) -> None:
+        """Stop profiling the calling thread"""
+        profile.disable()
+        self._stopped(profile)
+
+    def _stopped(self, profile: cProfile.Profile) -> None:
+        """A profiler is no longer running, once"""
+        with self._lock:
+            if self.running.pop(id(profile), None) is not None:
+                self.stopped.append(profile)
+
+    def collect(self, timeout: float) -> list[cProfile.Profile]:
+        """End the session and wait for the threads to pass a checkpoint or exit
+
+        Threads that don't do so in time are left out,
+        they stay profiled until their next event, checkpoint or exit.
+        """
+        self.active = False
+        end = monotonic() + timeout
+        while True:
+            with self._lock:
+                for key, (thread, profile) in list(self.running.items()):
+                    if not thread.is_alive():
+                        del self.running[key]
+                        self.stopped.append(profile)
+                if not self.running or monotonic() >= end:
+                    if self.running:
+                        logger.warning("left out %s busy threads", len(self.running))
+                    return list(self.stopped)
+            sleep(0.01)
+
+
+_LOCAL = local()  # the session and profiler of a thread, see `_Threads`
+
+
+class _Loaded:
+    """pstats statistics that have been loaded, to be added to a `pstats.Stats`"""
+
+    def __init__(self, stats: dict[Any, Any]):
+        self.stats = stats
+
+    def create_stats(self) -> None:
+        """They have been created already"""
+
+
+class Profiler:
+    """
+    The Profiler class profiles all threads of a running process on demand.
+
+    Nothing is installed while no profile is being taken,
+    so there is no overhead outside of a profiling session.
+    Only one session can run at a time.
+
+    Sampling collects the stacks of all threads at an interval and returns them
+    in the collapsed stack format, as used by i.e. `flamegraph.pl` and speedscope.
+
+    Deterministic profiling uses cProfile and returns a pstats file.
+    On Python >= 3.12 it covers all threads (through `sys.monitoring`),
+    before that every thread gets its own profiler, as a profile function is per thread,
+    threads that start during the session are covered,
+    running threads once they pass a `checkpoint`
+    (i.e. the capture and streaming loops).
+
+    Usage
+    -----
+    ```python
+    from pstats import Stats
+    from mjpegazer.utils.profiling import Profiler
+
+    with open("profile.collapsed", "w") as file:
+        file.write(Profiler.sample(10))
+
+    with open("profile.pstats", "wb") as file:
+        file.write(Profiler.deterministic(10))
+    Stats("profile.pstats").sort_stats("cumulative").print_stats(20)
+    ```
+    """
+
+    GRACE: float = 1.0  # seconds to wait for profiled threads to pass a checkpoint
+
+    _lock: Lock = Lock()
+    _threads: Optional[_Threads] = None
+
+    @classmethod
+    def sample(cls, duration: float, interval: float = 0.005) -> str:
+        """
+        Sample the stacks of all (other) threads.
+
+        Parameters
+        ----------
+        duration : float
+            Seconds to sample for.
+        interval : float
+            Seconds between samples.
+
+        Returns
+        -------
+        str
+            One line per unique stack, `thread;outer frame;...;inner frame count`
+
+        Raises
+        ------
+        ProfilingError
+            If another session is running.
+        """
+        stacks: Counter[str] = Counter()
+        with cls._session():
+            logger.info("sampling all threads for %ss", duration)
+            me = get_ident()
+            end = monotonic() + duration
+            while monotonic() < end:
+                names = {i.ident: i.name for i in threads()}
+                # pylint: disable=protected-access
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(
+                            f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+                        )
+                        frame = frame.f_back
+                    stack.append(names.get(ident, str(ident)))
+                    stacks[";".join(reversed(stack))] += 1
+                sleep(interval)
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.items())
+
+    @classmethod
+    def deterministic(cls, duration: float) -> bytes:
+        """
+        Profile all threads with cProfile.
+
+        Parameters
+        ----------
+        duration : float
+            Seconds to profile for.
+
+        Returns
+        -------
+        bytes
+            The statistics, in the file format of `pstats.Stats.dump_stats`
+
+        Raises
+        ------
+        ProfilingError
+            If another session is running.
+        """
+        if sys.version_info < (3, 12):
+            return cls._per_thread(duration)
+        profiler = cProfile.Profile()
+        with cls._session():
+            logger.info("profiling all threads for %ss", duration)
+            profiler.enable()
+            try:
+                sleep(duration)
+            finally:
+                profiler.disable()
+        profiler.create_stats()
+        return marshal.dumps(profiler.stats)
+
+    @staticmethod
+    def merge(mode: str, profiles: Mapping[str, bytes]) -> bytes:
+        """
+        Merge the profiles of several processes into one.
+
+        Parameters
+        ----------
+        mode : str
+            `sample` for collapsed stacks (utf-8 encoded),
+            these are prefixed with the name of their process,
+            or `deterministic` for pstats files, these are summed.
+        profiles : Mapping[str, bytes]
+            The profile per process name
+
+        Returns
+        -------
+        bytes
+            The merged profile
+        """
+        if mode == "sample":
+            return "".join(
+                f"{name};{line}\n"
+                for name, profile in profiles.items()
+                for line in profile.decode().splitlines()
+            ).encode()
+        stats = [_Loaded(marshal.loads(i)) for i in profiles.values()]
+        stats = [i for i in stats if i.stats]
+        return marshal.dumps(Stats(*stats).stats if stats else {})
+
+    @classmethod
+    def checkpoint(cls) -> None:
+        """
+        Start or stop profiling the calling thread, for deterministic profiling
+        on Python < 3.12.
+
+        To be called regularly by long running loops,
+        it does nothing outside of a session.
+        """
+        current = getattr(_LOCAL, "profile", None)
+        session = cls._threads
+        if current is not None:
+            owner, profile = current
+            if owner is not session:
+                _LOCAL.profile = None
+                owner.disable(profile)
+        elif session is not None:
+            session.enable()
+
+    @classmethod
+    def _per_thread(cls, duration: float) -> bytes:
+        """
+        Profile every thread with its own cProfile profiler (Python < 3.12).
+        """
+        session = _Threads()
+        with cls._session():
+            logger.info("profiling threads for %ss", duration)
+            threading.setprofile(session)  # before threads can see the session
+            cls._threads = session
+            try:
+                sleep(duration)
+            finally:
+                threading.setprofile(None)
+                cls._threads = None
+                profiles = session.collect(cls.GRACE)
+        for profile in profiles:
+            profile.create_stats()
+        profiles = [i for i in profiles if i.stats]
+        return marshal.dumps(Stats(*profiles).stats if profiles else {})
+
+    @classmethod
+    @contextmanager
+    def _session(cls) -> Iterator[None]:
+        """
+        Hold the session lock for the duration of the context.
+
+        Raises
+        ------
+        ProfilingError
+            If another session is running.
+        """
+        if not cls._lock.acquire(blocking=False):
+            raise ProfilingError("A profile is already being taken")
+        try:
+            yield
+        finally:
+            cls._lock.release()
@@ -0,0 +1,122 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from mjpegazer.core import Admission, AdmissionError, Server
+from mjpegazer.utils import ConfigurationError
+
+CLASSES = {"public": 0, "operator": 10}
+
+
+class TestAdmission(TestCase):
+    def setUp(self):
+        self.admission = Admission(
+            max_viewers=3,
+            max_stream_viewers=2,
+            classes=CLASSES,
+            tokens={"operator": "secret"},
+            default_class="public",
+        )
+
+    def test_limits(self):
+        admission = self.admission
+        admission.admit("a", "public")
+        admission.admit("a", "public")
+        with self.assertRaises(AdmissionError):
+            admission.admit("a", "public")
+        viewer = admission.admit("b", "public")
+        with self.assertRaises(AdmissionError):
+            admission.admit("c", "public")
+        self.assertEqual(admission.capacity(), (3, 3))
+        self.assertEqual(admission.capacity("a"), (2, 2))
+
+        admission.release(viewer)
+        admission.admit("c", "public")
+
+    def test_eviction(self):
+        admission = self.admission
+        first = admission.admit("a", "public")
+        second = admission.admit("a", "public")
+        operator = admission.admit("a", "operator")
+        self.assertFalse(first.evicted.is_set())
+        self.assertTrue(second.evicted.is_set())
+        self.assertEqual(admission.capacity("a"), (2, 2))
+
+        admission.admit("a", "operator")
+        self.assertTrue(first.evicted.is_set())
+        with self.assertRaises(AdmissionError):
+            admission.admit("a", "operator")
+        self.assertFalse(operator.evicted.is_set())
+
+    def test_watch(self):
+        admission = self.admission
+        viewer = admission.admit("a", "public")
+        frames = admission.watch(viewer, iter([b"1", b"2", b"3"]))
+        self.assertEqual(next(frames), b"1")
+        viewer.evicted.set()
+        self.assertEqual(list(frames), [])
+        self.assertEqual(admission.capacity("a"), (0, 2))
+
+    def test_classify(self):
+        classify = self.admission.classify
+        self.assertEqual(classify({}), "public")
+        self.assertEqual(classify({"Authorization": "Bearer secret"}), "operator")
+        self.assertEqual(classify({"Authorization": "Bearer wrong"}), "public")
+        self.assertEqual(classify({"X-Viewer-Class": "operator"}), "public")
+        self.assertEqual(classify({"X-Viewer-Class": "public"}), "public")
+        self.assertEqual(classify({"X-Viewer-Class": "unknown"}), "public")
+
+    def test_classify_header(self):
+        admission = Admission(
+            classes={"background": -10, "public": 0, "operator": 10},
+            tokens={},
+            default_class="public",
+        )
+        self.assertEqual(
+            admission.classify({"X-Viewer-Class": "background"}), "background"
+        )
+        self.assertEqual(admission.classify({"X-Viewer-Class": "operator"}), "public")
+
+    def test_default_configuration(self):
+        admission = Admission(max_stream_viewers=1)
+        viewer = admission.admit("a", admission.classify({}))
+        with self.assertRaises(AdmissionError):
+            admission.admit("a", admission.classify({"X-Viewer-Class": "operator"}))
+        self.assertFalse(viewer.evicted.is_set())
+
+    def test_unknown_class(self):
+        with self.assertRaises(ConfigurationError):
+            Admission(classes=CLASSES, tokens={"admin": "secret"})
+
+
+class TestServerAdmission(TestCase):
+    def setUp(self):
+        self.admission = Admission(classes=CLASSES, tokens={}, default_class="public")
+        self.admission.limit(Server.DEFAULT_STREAM, 1)
+        self.patches = [
+            patch.object(Server, "ADMISSION", self.admission),
+            patch.object(Server, "MJPEG", [b"frame"], create=True),
+        ]
+        for i in self.patches:
+            i.start()
+        self.client = Server.flask(__name__).test_client()
+
+    def tearDown(self):
+        for i in self.patches:
+            i.stop()
+
+    def test_retry_after(self):
+        viewer = self.admission.admit(Server.DEFAULT_STREAM, "public")
+        response = self.client.get("/live")
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response.headers)
+
+        self.admission.release(viewer)
+        response = self.client.get("/live")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b"frame")
+        self.assertEqual(self.admission.capacity(Server.DEFAULT_STREAM), (0, 1))
+
+    def test_head(self):
+        self.assertEqual(self.client.head("/live", buffered=True).status_code, 200)
+        self.assertEqual(self.admission.capacity(Server.DEFAULT_STREAM), (0, 1))
+        self.assertEqual(self.client.get("/live").status_code, 200)
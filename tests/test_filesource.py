@@ -0,0 +1,143 @@
+import fcntl
+import os
+from multiprocessing import get_context
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import sleep
+from unittest import TestCase
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+from mjpegazer.core import Admission, FileSource, MJPEGFrames, Pipeline, Server
+
+FRAMES = 5
+FPS = 50.0
+
+
+def write_video(path, value=0):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), FPS, (64, 48))
+    for i in range(FRAMES):
+        writer.write(np.full((48, 64, 3), value + i * 40, np.uint8))
+    writer.release()
+
+
+def build_locked(source, locked):
+    """Build the cache in another process, like a concurrent load would"""
+    source.cache.parent.mkdir(parents=True, exist_ok=True)
+    with open(source.cache.with_suffix(".lock"), "a") as lock:
+        fcntl.lockf(lock, fcntl.LOCK_EX)
+        locked.set()
+        sleep(0.2)
+        source._build(source._stat())
+
+
+class TestFileSource(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.video = Path(self.directory.name) / "video.avi"
+        self.cache = Path(self.directory.name) / "cache"
+        write_video(self.video)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def source(self):
+        source = FileSource(f"cache+{self.video}", cache_dir=str(self.cache))
+        source.load(block=True)
+        return source
+
+    def test_loop(self):
+        source = self.source()
+        with source as stream:
+            frames = [stream.read_encoded() for _ in range(FRAMES * 2 + 1)]
+        self.assertEqual(source.fps, FPS)
+        self.assertTrue(all(ret for ret, _, _ in frames))
+        jpegs = [jpeg for _, jpeg, _ in frames]
+        self.assertEqual(jpegs[:FRAMES], jpegs[FRAMES : FRAMES * 2])
+        timestamps = [timestamp for _, _, timestamp in frames]
+        self.assertEqual(timestamps, sorted(set(timestamps)))
+
+        ret, frame = stream.read()
+        self.assertTrue(ret)
+        self.assertEqual(frame.shape, (48, 64, 3))
+
+    def test_cache(self):
+        self.source()
+        files = sorted(i.suffix for i in self.cache.iterdir())
+        self.assertEqual(files, [".data", ".index", ".json", ".lock"])
+        data = next(self.cache.glob("*.data"))
+        built = data.stat().st_mtime_ns
+
+        self.source()  # reused
+        self.assertEqual(next(self.cache.glob("*.data")).stat().st_mtime_ns, built)
+
+        stat = self.video.stat()
+        content = bytearray(self.video.read_bytes())
+        content[-1] ^= 0xFF
+        self.video.write_bytes(content)
+        os.utime(self.video, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.source()  # same size and modification time, different hash
+        self.assertNotEqual(next(self.cache.glob("*.data")).stat().st_mtime_ns, built)
+
+    def test_mjpeg_frames(self):
+        frames = iter(MJPEGFrames(self.source(), Pipeline()))
+        part = next(frames)
+        self.assertIn(b"X-Timestamp: ", part)
+        self.assertIn(b"\xff\xd8", part)
+        frames.close()
+
+    def test_background(self):
+        source = FileSource(f"cache+{self.video}", cache_dir=str(self.cache))
+        self.assertFalse(source.ready.is_set())
+        with source as stream:
+            ret, _, _ = stream.read_encoded()  # waits for the cache
+        self.assertTrue(ret)
+        self.assertTrue(source.ready.is_set())
+
+    def test_incomplete(self):
+        self.source()
+        for suffix in (".data", ".index"):
+            next(self.cache.glob(f"*{suffix}")).unlink()
+            source = self.source()
+            self.assertTrue(source.ready.is_set())
+            self.assertEqual(len(list(self.cache.iterdir())), 4)
+
+    def test_unreadable(self):
+        self.video.write_bytes(b"")
+        source = self.source()
+        self.assertFalse(source.ready.is_set())
+        with source as stream:
+            self.assertEqual(stream.read(), (False, None))
+
+    def test_build_failure(self):
+        source = FileSource(f"cache+{self.video}", cache_dir=str(self.cache))
+        with patch("mjpegazer.core.filesource.cv2.imencode", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                source._build(source._stat())
+        self.assertEqual(list(self.cache.iterdir()), [])
+
+    def test_other_process(self):
+        source = FileSource(f"cache+{self.video}", cache_dir=str(self.cache))
+        context = get_context("fork")
+        locked = context.Event()
+        builder = context.Process(target=build_locked, args=(source, locked))
+        builder.start()
+        locked.wait()
+        with patch.object(
+            FileSource, "_build", side_effect=AssertionError("built twice")
+        ):
+            source.load(block=True)  # waits for the other process, maps its cache
+        builder.join()
+        self.assertTrue(source.ready.is_set())
+
+    def test_configure_in_worker(self):
+        with patch.object(Server, "ADMISSION", Admission()):
+            with patch.object(Server, "MJPEG", None, create=True):
+                with patch("mjpegazer.core.rest.parent_process", return_value=object()):
+                    with patch.object(FileSource, "load") as load:
+                        Server.configure(f"cache+{self.video}")  # in a capture worker
+                        load.assert_not_called()
+                with patch.object(FileSource, "load") as load:
+                    Server.configure(f"cache+{self.video}")
+                    load.assert_called_once()
@@ -1,9 +1,12 @@
 from contextlib import AbstractContextManager
+from pathlib import Path
 from re import L
+from tempfile import TemporaryDirectory
 from unittest import TestCase
+from unittest.mock import patch
 
 import cv2
-from mjpegazer.core import MJPEGFrames
+from mjpegazer.core import Capture, MJPEGFrames, Pipeline
 import numpy as np
 from mjpegazer.utils.constants import HEALTH_THRESHOLD
 
@@ -24,12 +27,27 @@ class VideoCaptureMock:
         return self._yields < 10
 
 
+class FailingVideoCaptureMock(VideoCaptureMock):
+    def read(self):
+        if self._yields % 2:
+            return False, None
+        return True, MOCK_IMAGE
+
+
+class BrokenVideoCaptureMock(VideoCaptureMock):
+    def read(self):
+        return False, None
+
+    def isOpened(self):
+        return True
+
+
 class ContextManager(AbstractContextManager):
-    def __init__(self):
-        pass
+    def __init__(self, capture=VideoCaptureMock):
+        self._capture = capture
 
     def __enter__(self) -> VideoCaptureMock:
-        return VideoCaptureMock()
+        return self._capture()
 
     def __exit__(self, *_) -> bool:
         return False
@@ -61,3 +79,26 @@ class TestMJPEG(TestCase):
             raise Exception("The test is broken, is cv2 installed?")
         for i in mjpeg_object:
             self.assertIn(mock.tobytes(), i)
+
+    def test_failed_reads(self):
+        mjpeg_object = MJPEGFrames(ContextManager(FailingVideoCaptureMock))
+        self.assertEqual(len(list(mjpeg_object)), 4)
+
+    def test_broken(self):
+        mjpeg_object = MJPEGFrames(ContextManager(BrokenVideoCaptureMock))
+        with patch("mjpegazer.core.mjpeg.FAILURE_BACKOFF", 0.0):
+            self.assertEqual(list(mjpeg_object), [])
+        self.assertFalse(mjpeg_object.healthy)
+
+    def test_end_of_file(self):
+        with TemporaryDirectory() as directory:
+            path = str(Path(directory) / "short.avi")
+            writer = cv2.VideoWriter(
+                path, cv2.VideoWriter_fourcc(*"MJPG"), 25, (100, 100)
+            )
+            for _ in range(5):
+                writer.write(cv2.cvtColor(MOCK_IMAGE, cv2.COLOR_GRAY2BGR))
+            writer.release()
+            mjpeg_object = MJPEGFrames(Capture(path), Pipeline())
+            self.assertEqual(len(list(mjpeg_object)), 5)
+            self.assertEqual(mjpeg_object._failures, 1)  # ended at once
@@ -0,0 +1,172 @@
+import marshal
+import os
+import sys
+from threading import Event, Thread
+from time import sleep
+from unittest import TestCase
+from unittest.mock import patch
+
+from mjpegazer.core import Server, Supervisor
+from mjpegazer.utils import Profiler, ProfilingError
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def checkpoint_loop(stop):
+    while not stop.is_set():
+        Profiler.checkpoint()
+        sum(i for i in range(100))
+
+
+def starting(target):
+    """A sleep that runs a new thread first, to start it during a session"""
+    thread = Thread(target=target)
+
+    def session_sleep(duration):
+        if thread.ident is None:
+            thread.start()
+            thread.join()
+        sleep(duration)
+
+    return session_sleep
+
+
+def short_loop():
+    for _ in range(100):
+        sum(range(100))
+
+
+class TestProfiler(TestCase):
+    def setUp(self):
+        self.stop = Event()
+        self.thread = Thread(target=busy_loop, args=(self.stop,), name="busy")
+        self.thread.start()
+
+    def tearDown(self):
+        self.stop.set()
+        self.thread.join()
+
+    def test_sample(self):
+        collapsed = Profiler.sample(0.1, 0.001)
+        lines = [i for i in collapsed.splitlines() if i.startswith("busy;")]
+        self.assertTrue(lines)
+        stack, count = lines[0].rsplit(" ", 1)
+        self.assertIn("busy_loop", stack)
+        self.assertGreater(int(count), 0)
+
+    def test_one_session(self):
+        with Profiler._session():
+            with self.assertRaises(ProfilingError):
+                Profiler.sample(0.01)
+
+    def test_deterministic(self):
+        stop = Event()
+        thread = Thread(target=checkpoint_loop, args=(stop,))
+        thread.start()
+        try:
+            with patch("mjpegazer.utils.profiling.sleep", starting(short_loop)):
+                stats = marshal.loads(Profiler.deterministic(0.2))
+        finally:
+            stop.set()
+            thread.join()
+        names = {name for _, _, name in stats}
+        self.assertIn("short_loop", names)
+        # of the running thread that passed a checkpoint
+        self.assertIn("<genexpr>", names)
+        self.assertIsNone(Profiler._threads)
+
+    def test_left_out(self):
+        release = Event()
+        profiles = []
+
+        def idle():
+            release.wait()  # through the session
+            profiles.append(sys.getprofile())
+
+        thread = Thread(target=idle)
+
+        def session_sleep(duration):
+            if thread.ident is None:
+                thread.start()
+            sleep(duration)
+
+        with patch("mjpegazer.utils.profiling.sleep", session_sleep):
+            with patch.object(Profiler, "GRACE", 0.05):
+                Profiler.deterministic(0.05)
+        release.set()
+        thread.join()
+        self.assertEqual(profiles, [None])  # not profiled after the session
+
+    def test_merge(self):
+        collapsed = Profiler.merge(
+            "sample", {"http": b"main;a 1\n", "capture-0": b"b;c 2\n"}
+        )
+        self.assertEqual(collapsed, b"http;main;a 1\ncapture-0;b;c 2\n")
+
+        profile = marshal.loads(Profiler.deterministic(0.01))
+        merged = marshal.loads(
+            Profiler.merge(
+                "deterministic", {"a": marshal.dumps(profile), "b": marshal.dumps({})}
+            )
+        )
+        self.assertEqual(set(merged), set(profile))
+
+
+class TestWorkerProfiles(TestCase):
+    def test_profiles(self):
+        supervisor = Supervisor(processes=1, frame_size=1024)
+        supervisor.start()
+        try:
+            directory = supervisor.profile("sample", 0.2, 0.01)
+            profiles = supervisor.profiles(directory, 30.0)
+        finally:
+            supervisor.stop()
+        self.assertEqual(list(profiles), ["capture-0"])
+        self.assertIn(b"_worker", profiles["capture-0"])
+        self.assertFalse(os.path.exists(directory))
+
+
+class TestProfileEndpoint(TestCase):
+    def setUp(self):
+        self.client = Server.flask(__name__).test_client()
+
+    def test_disabled(self):
+        with patch("mjpegazer.core.rest.ADMIN_TOKEN", ""):
+            self.assertEqual(self.client.get("/admin/profile").status_code, 404)
+
+    def test_authorization(self):
+        with patch("mjpegazer.core.rest.ADMIN_TOKEN", "secret"):
+            response = self.client.get("/admin/profile")
+            self.assertEqual(response.status_code, 401)
+            response = self.client.get(
+                "/admin/profile",
+                query_string={"duration": 0.05},
+                headers={"Authorization": "Bearer wrong"},
+            )
+            self.assertEqual(response.status_code, 401)
+            response = self.client.get(
+                "/admin/profile",
+                query_string={"duration": 0.05},
+                headers={"Authorization": "Bearer secret"},
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("profile.collapsed", response.headers["Content-Disposition"])
+
+    def test_invalid_parameters(self):
+        headers = {"Authorization": "Bearer secret"}
+        with patch("mjpegazer.core.rest.ADMIN_TOKEN", "secret"):
+            for query in (
+                {"interval": -1},
+                {"interval": 0},
+                {"interval": "nan"},
+                {"duration": 0},
+                {"duration": "inf"},
+                {"mode": "unknown", "duration": 0.01},
+            ):
+                response = self.client.get(
+                    "/admin/profile", query_string=query, headers=headers
+                )
+                self.assertEqual(response.status_code, 400, query)
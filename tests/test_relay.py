@@ -0,0 +1,71 @@
+from io import BytesIO
+from threading import Thread
+from unittest import TestCase
+
+import cv2
+import numpy as np
+from flask import Flask, Response
+from werkzeug.serving import make_server
+
+from mjpegazer.core import MJPEGFrames, Pipeline, Relay
+from mjpegazer.core.mjpeg import multipart
+from mjpegazer.core.relay import parts
+
+MOCK_IMAGE = np.random.randint(0, 256, (100, 100, 3), dtype=np.uint8)
+MOCK_JPEG = cv2.imencode(".jpg", MOCK_IMAGE)[1].tobytes()
+
+
+def origin_frames():
+    for i in range(1, 1000):
+        yield multipart(MOCK_JPEG, float(i))
+
+
+class TestParts(TestCase):
+    def test_parts(self):
+        stream = BytesIO(multipart(MOCK_JPEG, 1.5) + multipart(b"\r\n--x\r\n", 2.0))
+        self.assertEqual(list(parts(stream)), [(MOCK_JPEG, 1.5), (b"\r\n--x\r\n", 2.0)])
+
+    def test_parts_without_length(self):
+        stream = BytesIO(
+            b"--frame\r\nContent-Type: image/jpeg\r\nX-Timestamp: 3\r\n\r\n"
+            + MOCK_JPEG
+            + b"\r\n--frame--\r\n"
+        )
+        self.assertEqual(list(parts(stream)), [(MOCK_JPEG, 3.0)])
+
+
+class TestRelay(TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        app.add_url_rule(
+            "/live",
+            view_func=lambda: Response(
+                origin_frames(), mimetype="multipart/x-mixed-replace; boundary=frame"
+            ),
+        )
+        self.server = make_server("127.0.0.1", 0, app, threaded=True)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"relay+http://127.0.0.1:{self.server.server_port}/live"
+
+    def tearDown(self):
+        self.server.shutdown()
+
+    def test_relay(self):
+        relay = Relay(self.url, timeout=5.0)
+        first = iter(MJPEGFrames(relay, Pipeline()))
+        second = iter(MJPEGFrames(relay, Pipeline()))
+        frame = next(first)
+        self.assertIn(MOCK_JPEG, frame)
+        self.assertIn(b"X-Timestamp: ", frame)
+        self.assertIn(MOCK_JPEG, next(second))
+        self.assertEqual(relay._viewers, 2)
+        first.close()
+        second.close()
+        self.assertFalse(relay.subscribed)
+
+    def test_decode(self):
+        relay = Relay(self.url, timeout=5.0)
+        with relay as stream:
+            ret, frame = stream.read()
+            self.assertTrue(ret)
+            self.assertEqual(frame.shape, MOCK_IMAGE.shape)
@@ -0,0 +1,215 @@
+import os
+from copy import copy
+from queue import Queue
+from threading import Event, Thread
+from unittest import TestCase
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+from mjpegazer.core import FrameSlot, Server, SharedFrames, Source, Supervisor
+from mjpegazer.core.supervisor import _capture
+from mjpegazer.utils import ConfigurationError
+
+MOCK_IMAGE = np.random.randint(0, 256, (100, 100), dtype=np.uint8)
+
+
+class TestFrameSlot(TestCase):
+    def setUp(self):
+        self.slot = FrameSlot(size=64 * 1024)
+        self.jpeg = cv2.imencode(".jpg", MOCK_IMAGE)[1]
+
+    def tearDown(self):
+        self.slot.unlink()
+
+    def test_read_write(self):
+        self.assertIsNone(self.slot.read())
+        self.assertFalse(self.slot.healthy)
+
+        self.assertTrue(self.slot.write(self.jpeg))
+        sequence, jpeg, timestamp = self.slot.read()
+        self.assertEqual(jpeg, self.jpeg.tobytes())
+        self.assertIsNone(self.slot.read(sequence))
+        self.assertTrue(self.slot.healthy)
+
+        attached = FrameSlot(self.slot.name)
+        self.assertEqual(attached.read(), (sequence, jpeg, timestamp))
+        attached.close()
+
+    def test_too_large(self):
+        self.assertFalse(self.slot.write(np.zeros(128 * 1024, np.uint8)))
+
+    def test_shared_frames(self):
+        self.slot.write(self.jpeg)
+        part = next(iter(SharedFrames(self.slot)))
+        self.assertIn(self.jpeg.tobytes(), part)
+
+    def test_capture_error(self):
+        stop = Event()
+        with patch(
+            "mjpegazer.core.supervisor.Capture", side_effect=cv2.error("broken")
+        ):
+            thread = Thread(
+                target=_capture, args=("a", "url", "", self.slot.name, Queue(), stop)
+            )
+            thread.start()
+            for _ in range(100):
+                if self.slot.header[3]:  # failures
+                    break
+                stop.wait(0.01)
+            self.assertTrue(thread.is_alive())  # retries
+            stop.set()
+            thread.join(2.0)
+        self.assertFalse(thread.is_alive())
+
+    def test_inactive(self):
+        self.slot.write(self.jpeg)
+        self.assertEqual(list(SharedFrames(self.slot, active=lambda: False)), [])
+
+
+class TestSupervisor(TestCase):
+    def setUp(self):
+        self.supervisor = Supervisor(processes=2, frame_size=1024)
+
+    def tearDown(self):
+        self.supervisor.stop()
+
+    def test_balance(self):
+        supervisor = self.supervisor
+        supervisor.add("large", Source("large", 1920, 1080, 30))
+        supervisor.add("small_1", Source("small_1", 640, 480, 15))
+        supervisor.add("small_2", Source("small_2", 640, 480, 15))
+        self.assertEqual(supervisor.assignment["large"], 0)
+        self.assertEqual(supervisor.assignment["small_1"], 1)
+        self.assertEqual(supervisor.assignment["small_2"], 1)
+
+        supervisor.add("medium", Source("medium", 1280, 720, 25))
+        supervisor.remove("large")
+        self.assertNotIn("large", supervisor.slots)
+        loads = supervisor.loads
+        self.assertEqual(sum(loads), sum(i.weight for i in supervisor.sources.values()))
+        self.assertTrue(all(loads))
+
+    def test_duplicate(self):
+        self.supervisor.add("source", Source("url"))
+        with self.assertRaises(ConfigurationError):
+            self.supervisor.add("source", Source("url"))
+
+    def test_move(self):
+        supervisor = self.supervisor
+        supervisor._commands = [Queue(), Queue()]
+        supervisor.add("source", Source("url"))
+        self.assertEqual(supervisor._commands[0].get_nowait()[:2], ("start", "source"))
+
+        supervisor._assign("source", 1)
+        self.assertEqual(supervisor._commands[0].get_nowait(), ("stop", "source"))
+        self.assertTrue(supervisor._commands[1].empty())  # not before it stopped
+        supervisor._assign("source", 0)
+        supervisor._assign("source", 1)
+        self.assertTrue(supervisor._commands[0].empty())
+
+        supervisor._stopped("source")
+        self.assertEqual(supervisor._commands[1].get_nowait()[:2], ("start", "source"))
+        self.assertEqual(supervisor.assignment["source"], 1)
+
+    def test_probed(self):
+        supervisor = self.supervisor
+        supervisor.add("a", Source("a"))
+        supervisor.add("b", Source("b"))
+        supervisor.add("c", Source("c"))
+        self.assertEqual(supervisor.assignment, {"a": 0, "b": 1, "c": 0})
+
+        supervisor._probed("a", 1920, 1080, 30.0)
+        self.assertEqual(supervisor.sources["a"].weight, 1920 * 1080 * 30.0)
+        self.assertEqual(supervisor.assignment, {"a": 0, "b": 1, "c": 1})
+        supervisor._probed("unknown", 1920, 1080, 30.0)
+
+    def test_registry(self):
+        supervisor = self.supervisor
+        supervisor.add("a", Source("a"))
+        forked = copy(supervisor)  # as if forked before "b" was added
+        forked._pid = 0
+        forked.slots = {name: FrameSlot(i.name) for name, i in supervisor.slots.items()}
+        frames = iter(forked.frames("a"))
+        self.assertIsNone(forked.slot("b"))
+
+        supervisor.add("b", Source("b"))
+        self.assertTrue(forked.slot("b").write(b"jpeg"))
+        self.assertEqual(supervisor.slots["b"].read()[1], b"jpeg")
+
+        supervisor.remove("a")
+        self.assertIsNone(forked.slot("a"))
+        self.assertEqual(list(frames), [])
+        for slot in forked.slots.values():
+            slot.close()
+
+    def test_remove_streaming(self):
+        supervisor = self.supervisor
+        supervisor.add("a", Source("a"))
+        supervisor.slots["a"].write(b"jpeg")
+        frames = iter(supervisor.frames("a"))
+        self.assertIn(b"jpeg", next(frames))
+        supervisor.remove("a")
+        self.assertEqual(list(frames), [])  # not reading the removed slot
+
+    def test_forward(self):
+        supervisor = self.supervisor
+        supervisor._pid = 0
+        supervisor.add("a", Source("a"))
+        supervisor.remove("a")
+        supervisor._pid = os.getpid()
+        event, name, source = supervisor._events.get(timeout=1.0)
+        self.assertEqual((event, name, source.video_url), ("add", "a", "a"))
+        self.assertEqual(supervisor._events.get(timeout=1.0), ("remove", "a"))
+
+
+class TestServerSources(TestCase):
+    def setUp(self):
+        self.supervisor = Supervisor(processes=1, frame_size=1024)
+        self.patches = [
+            patch.object(Server, "SUPERVISOR", self.supervisor),
+            patch("mjpegazer.core.rest.ADMIN_TOKEN", "secret"),
+        ]
+        for i in self.patches:
+            i.start()
+        self.client = Server.flask(__name__).test_client()
+        self.headers = {"Authorization": "Bearer secret"}
+
+    def tearDown(self):
+        for i in self.patches:
+            i.stop()
+        self.supervisor.stop()
+
+    def test_add_remove(self):
+        client, headers = self.client, self.headers
+        self.assertEqual(
+            client.put("/admin/sources/a", json={"video_url": "a"}).status_code, 401
+        )
+        response = client.put(
+            "/admin/sources/a", json={"video_url": "a"}, headers=headers
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertIn("a", self.supervisor.sources)
+        self.assertEqual(client.get("/health/a").status_code, 503)
+        response = client.put(
+            "/admin/sources/a", json={"video_url": "a"}, headers=headers
+        )
+        self.assertEqual(response.status_code, 409)
+        response = client.put(
+            "/admin/sources/b", json={"transforms": "grayscale"}, headers=headers
+        )
+        self.assertEqual(response.status_code, 400)
+        response = client.put(
+            "/admin/sources/b",
+            json={"video_url": "b", "transforms": "sharpen"},
+            headers=headers,
+        )
+        self.assertEqual(response.status_code, 400)
+
+        self.assertEqual(
+            client.delete("/admin/sources/a", headers=headers).status_code, 202
+        )
+        self.assertEqual(
+            client.delete("/admin/sources/a", headers=headers).status_code, 404
+        )
+        self.assertEqual(client.get("/health/a").status_code, 404)
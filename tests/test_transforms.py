@@ -0,0 +1,96 @@
+from unittest import TestCase
+
+import cv2
+import numpy as np
+from mjpegazer.core import (
+    Crop,
+    Flip,
+    Grayscale,
+    Pipeline,
+    Resize,
+    Rotate,
+    Timestamp,
+    Transform,
+)
+from mjpegazer.utils import ConfigurationError
+
+MOCK_IMAGE = np.random.randint(0, 256, (60, 80, 3), dtype=np.uint8)
+
+
+class TestTransforms(TestCase):
+    def test_flip(self):
+        flip = Flip(1)
+        frame = flip(MOCK_IMAGE)
+        np.testing.assert_array_equal(frame, cv2.flip(MOCK_IMAGE, 1))
+
+    def test_rotate(self):
+        self.assertEqual(Rotate(90)(MOCK_IMAGE).shape, (80, 60, 3))
+        self.assertEqual(Rotate(180)(MOCK_IMAGE).shape, (60, 80, 3))
+
+    def test_crop(self):
+        frame = Crop(10, 5, 20, 30)(MOCK_IMAGE)
+        self.assertEqual(frame.shape, (30, 20, 3))
+        self.assertTrue(np.shares_memory(frame, MOCK_IMAGE))
+
+    def test_crop_outside(self):
+        for crop in (Crop(70, 0, 20, 20), Crop(0, 50, 20, 20), Crop(100, 100, 1, 1)):
+            with self.assertRaises(ConfigurationError):
+                crop(MOCK_IMAGE)
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            Transform()
+
+    def test_resize(self):
+        self.assertEqual(Resize(40, 30)(MOCK_IMAGE).shape, (30, 40, 3))
+
+    def test_grayscale(self):
+        frame = Grayscale()(MOCK_IMAGE)
+        self.assertEqual(frame.shape, (60, 80))
+        self.assertIs(Grayscale()(frame), frame)
+
+    def test_timestamp(self):
+        frame = MOCK_IMAGE.copy()
+        self.assertIs(Timestamp()(frame), frame)
+
+    def test_buffers_are_reused(self):
+        pipeline = Pipeline([Flip(1), Rotate(90), Resize(40, 30), Grayscale()])
+        first = pipeline(MOCK_IMAGE)
+        second = pipeline(MOCK_IMAGE)
+        self.assertIs(first, second)
+        for transform in pipeline.transforms:
+            buffer = transform._dst
+            pipeline(MOCK_IMAGE)
+            self.assertIs(transform._dst, buffer)
+
+    def test_copy(self):
+        pipeline = Pipeline([Flip(1), Resize(40, 30)])
+        pipeline(MOCK_IMAGE)
+        copy = pipeline.copy()
+        self.assertEqual([type(i) for i in copy.transforms], [Flip, Resize])
+        self.assertIsNot(copy(MOCK_IMAGE), pipeline(MOCK_IMAGE))
+        np.testing.assert_array_equal(copy(MOCK_IMAGE), pipeline(MOCK_IMAGE))
+        for original, transform in zip(pipeline.transforms, copy.transforms):
+            self.assertIsNot(transform, original)
+            self.assertFalse(np.shares_memory(transform._dst, original._dst))
+
+    def test_parse(self):
+        pipeline = Pipeline.parse("crop=0,0,40,40; rotate=270;resize=20,10;grayscale")
+        self.assertEqual(
+            [type(i) for i in pipeline.transforms],
+            [Crop, Rotate, Resize, Grayscale],
+        )
+        self.assertEqual(pipeline(MOCK_IMAGE).shape, (10, 20))
+        self.assertFalse(Pipeline.parse(""))
+
+    def test_parse_invalid(self):
+        for spec in (
+            "sharpen",
+            "rotate=45",
+            "resize=10",
+            "crop=a,b,c,d",
+            "timestamp=5",
+            "grayscale=1",
+        ):
+            with self.assertRaises(ConfigurationError):
+                Pipeline.parse(spec)